@@ -1,5 +1,6 @@
+import src.ems.functions.archive as archive
 import src.ems.st_pages.result_dashboard as dashboard
-import src.ems.functions.sql_queries as sql
+from src.ems.functions.db import StaleRequestError
 import streamlit as st
 
 #Streamlit
@@ -15,27 +16,39 @@ def main():
     with view_simulation_col:
         selected_simulation = dashboard.render_simulation_selection(pg_engine)
 
+    #archived games are replayed from their bundle, everything below reads from sim_engine
+    sim_engine = archive.simulation_engine(pg_engine, selected_simulation)
+
     with view_round_col:
         selected_round_specific = dashboard.render_detailing_selection()
     
-    selected_round = dashboard.render_select_view_round(pg_engine, selected_simulation, selected_round_specific)
+    selected_round = dashboard.render_select_view_round(sim_engine, selected_simulation, selected_round_specific)
 
 
     #Dashboard Components, only available if valid simulation selected
     dashboard_left, dashboard_right = st.columns([0.5, 0.5])
     if selected_round_specific == 'Round Specific' and selected_simulation is not None:
-        reporting_table = sql.get_reporting_table(pg_engine, selected_simulation, selected_round)
         with dashboard_left:
-            dashboard.render_dollar_per_mwh_bar(reporting_table)
-            dashboard.render_capacity_bar(reporting_table)
+            dashboard.render_dollar_per_mwh_bar(sim_engine, selected_simulation, selected_round)
+            dashboard.render_capacity_bar(sim_engine, selected_simulation, selected_round)
         with dashboard_right:
-            dashboard.render_revenue_cost_stackedbar(reporting_table)
+            dashboard.render_revenue_cost_stackedbar(sim_engine, selected_simulation, selected_round)
+        date_range = dashboard.render_date_range_selection(sim_engine, selected_simulation, selected_round)
+        dashboard.render_market_timeseries(sim_engine, selected_simulation, selected_round, date_range)
+        dashboard.render_dispatch_timeseries(sim_engine, selected_simulation, selected_round, date_range)
 
     elif selected_round_specific == 'Overview' and selected_simulation is not None:
         with dashboard_left:
-            dashboard.render_profit_line(pg_engine, selected_simulation)
+            dashboard.render_profit_line(sim_engine, selected_simulation)
         #with dashboard_right:
 
+    elif selected_round_specific == 'Round Delta' and selected_simulation is not None:
+        dashboard.render_round_delta(sim_engine, selected_simulation, selected_round)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    except StaleRequestError:
+        #a newer rerun has already started, end this one quietly and leave the session to it
+        pass
\ No newline at end of file
@@ -0,0 +1,33 @@
+import src.ems.st_pages.facilitator_dashboard as facilitator_dashboard
+import src.ems.st_pages.input_dashboard as input_dashboard
+from src.ems.functions.db import StaleRequestError
+import streamlit as st
+
+#Streamlit
+st.set_page_config(layout = "wide")
+st.sidebar.markdown("Main Page")
+st.header("Facilitator Monitor", divider = "blue")
+
+def main():
+    db_engine = input_dashboard.postgres_connect()
+
+    with st.sidebar:
+        facilitator_dashboard.render_archive_controls(db_engine)
+
+    selected_simulation = facilitator_dashboard.render_simulation_selection(db_engine)
+    if selected_simulation is None:
+        st.info("Select a simulation to monitor player submissions")
+        return
+
+    watcher = facilitator_dashboard.get_progress_watcher(db_engine, selected_simulation)
+    facilitator_dashboard.render_progress_monitor(watcher)
+    facilitator_dashboard.render_finish_simulation(db_engine, selected_simulation)
+    facilitator_dashboard.render_storage_controls(selected_simulation)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except StaleRequestError:
+        #a newer rerun has already started, end this one quietly and leave the session to it
+        pass
@@ -0,0 +1,31 @@
+import src.ems.st_pages.comparison_dashboard as comparison_dashboard
+from src.ems.functions.db import StaleRequestError
+import streamlit as st
+
+#Streamlit
+st.set_page_config(layout = "wide")
+st.sidebar.markdown("Main Page")
+st.header("Simulation Comparison", divider = "blue")
+
+def main():
+    db_engine = comparison_dashboard.postgres_connect()
+
+    simulation_col, metric_col = st.columns([2/3, 1/3])
+    with simulation_col:
+        selected_simulations = comparison_dashboard.render_simulation_multiselect(db_engine)
+    with metric_col:
+        selected_metric = comparison_dashboard.render_metric_selection()
+
+    if not selected_simulations:
+        st.info("Select the simulations to compare")
+        return
+
+    comparison_dashboard.render_comparison(db_engine, selected_simulations, selected_metric)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except StaleRequestError:
+        #a newer rerun has already started, end this one quietly and leave the session to it
+        pass
@@ -0,0 +1,230 @@
+"""
+Simulation archive and restore.
+
+A finished simulation is exported to one bundle file: a zip of zstd compressed Parquet files, one per
+table and view of its raw_/stage_/warehouse_/mart_ schemas, plus a manifest with the registry row and row
+counts. Views are exported with the rows they return and come back as tables on restore.
+Once the bundle is verified the schemas are dropped and the registry row is kept with status 'archived'
+and the bundle path, so catalog scans only see live games. Archived games are replayed in the result
+dashboard from a local SQLite copy of the bundle, or restored into the database in bulk.
+"""
+import src.ems.functions.db as db
+import src.ems.functions.local_db as local_db
+import src.ems.functions.sql_queries as sql
+from src.ems.settings import get_settings
+import datetime
+import json
+import pathlib
+import tempfile
+import weakref
+import zipfile
+import pandas as pd
+import streamlit as st
+from sqlalchemy import create_engine, text
+
+MANIFEST = 'manifest.json'
+BUNDLE_VERSION = 1
+PARQUET_COMPRESSION = 'zstd'
+RESTORE_CHUNKSIZE = 50_000
+#shared reference tables the result dashboard reads, snapshotted so a replay doesn't depend on the live setup
+REFERENCE_TABLES = ['player_table']
+
+def bundle_path(archive_dir, sim_name) -> pathlib.Path:
+    return pathlib.Path(archive_dir) / f'{sim_name}.simbundle.zip'
+
+def _write_parquet(bundle, entry, df):
+    #pyarrow is only needed once a game is archived or replayed, keep it out of page start-up
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    with tempfile.NamedTemporaryFile(suffix = '.parquet') as tmp:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index = False), tmp.name, compression = PARQUET_COMPRESSION)
+        #parquet pages are already compressed, zipping them again only costs time
+        bundle.write(tmp.name, entry, compress_type = zipfile.ZIP_STORED)
+
+def _read_parquet(bundle, entry):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    with bundle.open(entry) as f:
+        return pq.read_table(pa.BufferReader(f.read())).to_pandas()
+
+def read_manifest(path) -> dict:
+    with zipfile.ZipFile(path) as bundle:
+        return json.loads(bundle.read(MANIFEST))
+
+def export_simulation(engine, sim_name, archive_dir = None) -> pathlib.Path:
+    """
+    Writes every table of the simulation to its bundle in archive_dir and returns the bundle path.
+    The bundle is written under a temporary name and renamed once complete, so a failed export
+    never leaves a partial bundle behind.
+    """
+    archive_dir = pathlib.Path(archive_dir or get_settings().archive_dir)
+    archive_dir.mkdir(parents = True, exist_ok = True)
+    path = bundle_path(archive_dir, sim_name)
+    partial_path = path.with_suffix('.partial')
+
+    registry = sql.get_simulation_registry(engine)
+    registry_row = registry[registry.sim_name == sim_name]
+    if registry_row.empty:
+        raise ValueError(f"{sim_name} is not in the simulation registry")
+    registry_row = registry_row.iloc[0]
+
+    tables = sql.get_simulation_tables(engine, sim_name)
+    manifest = {
+        'version': BUNDLE_VERSION,
+        'sim_name': sim_name,
+        'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'created_at': str(registry_row.created_at),
+        'round_count': int(sql.get_current_round(engine, sim_name)),
+        'player_count': int(registry_row.player_count),
+        'status': registry_row.status,
+        'tables': [],
+        'reference_tables': [],
+    }
+
+    with zipfile.ZipFile(partial_path, 'w') as bundle:
+        with engine.connect() as con:
+            for _, row in tables.iterrows():
+                layer = row.schema_name[:-len(sim_name) - 1]
+                df = pd.read_sql(sql = text(f'select * from [{row.schema_name}].[{row.table_name}]'), con = con)
+                _write_parquet(bundle, f'{layer}/{row.table_name}.parquet', df)
+                manifest['tables'].append({'layer': layer, 'table': row.table_name, 'object_type': row.object_type, 'rows': len(df)})
+
+            for table in REFERENCE_TABLES:
+                df = pd.read_sql(sql = text(f'select * from initial_game_setups.{table}'), con = con)
+                _write_parquet(bundle, f'initial_game_setups/{table}.parquet', df)
+                manifest['reference_tables'].append({'table': table, 'rows': len(df)})
+
+        bundle.writestr(MANIFEST, json.dumps(manifest, indent = 2))
+
+    partial_path.replace(path)
+    return path
+
+def verify_bundle(engine, sim_name, path) -> bool:
+    #The bundle must hold every table of the live simulation with the same row count
+    manifest = read_manifest(path)
+    archived = {(f"{table['layer']}_{sim_name}", table['table']): table['rows'] for table in manifest['tables']}
+    with engine.connect() as con:
+        for _, row in sql.get_simulation_tables(engine, sim_name).iterrows():
+            live_rows = con.execute(text(f'select count(*) from [{row.schema_name}].[{row.table_name}]')).scalar()
+            if archived.get((row.schema_name, row.table_name)) != live_rows:
+                return False
+
+    return True
+
+def archive_simulation(engine, sim_name, archive_dir = None) -> pathlib.Path:
+    """
+    Exports the simulation, verifies the bundle against the live tables, then drops its schemas
+    and marks it archived in the registry.
+    """
+    path = export_simulation(engine, sim_name, archive_dir)
+    if not verify_bundle(engine, sim_name, path):
+        raise RuntimeError(f"Archive of {sim_name} at {path} does not match the database, schemas were not dropped")
+
+    sql.drop_simulation_schemas(engine, sim_name)
+    sql.update_simulation_registry(engine, sim_name, status = 'archived', archive_path = str(path))
+    return path
+
+def restore_simulation(engine, path, sim_name = None) -> str:
+    """
+    Bulk loads a bundle back into the database, optionally under a new simulation name, and
+    registers it with the status it was archived with. Schemas, tables and the registry row are
+    written in one transaction, so a failed restore leaves nothing behind.
+    Returns the restored simulation name.
+    """
+    manifest = read_manifest(path)
+    sim_name = sim_name or manifest['sim_name']
+    registry = sql.get_simulation_registry(engine)
+    existing = registry[registry.sim_name == sim_name]
+    if not existing.empty and existing.status.iloc[0] != 'archived':
+        raise ValueError(f"{sim_name} already exists and is not archived")
+
+    with engine.begin() as con, zipfile.ZipFile(path) as bundle:
+        for layer in sql.SIMULATION_LAYERS:
+            con.execute(text(f"if schema_id('{layer}_{sim_name}') is null exec('create schema [{layer}_{sim_name}]')"))
+
+        for table in manifest['tables']:
+            df = _read_parquet(bundle, f"{table['layer']}/{table['table']}.parquet")
+            df.to_sql(
+                name = table['table'],
+                con = con,
+                schema = f"{table['layer']}_{sim_name}",
+                if_exists = 'replace',
+                index = False,
+                chunksize = RESTORE_CHUNKSIZE
+            )
+
+        sql.restore_simulation_registry(con, sim_name, manifest['round_count'], manifest['player_count'], manifest['status'])
+
+    sql.provision_simulation_storage(engine, sim_name)
+    return sim_name
+
+def retention_candidates(engine, max_age_days = None, max_count = None) -> list:
+    """
+    Finished simulations to archive: those created more than max_age_days ago, and the oldest
+    ones beyond the newest max_count finished simulations. 0 disables a limit, None uses
+    ARCHIVE_MAX_AGE_DAYS / ARCHIVE_MAX_COUNT from the settings.
+    """
+    settings = get_settings()
+    max_age_days = settings.archive_max_age_days if max_age_days is None else max_age_days
+    max_count = settings.archive_max_count if max_count is None else max_count
+
+    finished = sql.get_simulation_registry(engine, status = 'finished')
+    candidates = set()
+    if max_age_days:
+        #created_at is written by the database as UTC (sysutcdatetime), compare it with UTC now
+        cutoff = pd.Timestamp.now(tz = 'UTC').tz_localize(None) - pd.Timedelta(days = max_age_days)
+        candidates.update(finished[pd.to_datetime(finished.created_at) < cutoff].sim_name)
+    if max_count and len(finished) > max_count:
+        #registry rows are ordered oldest first
+        candidates.update(finished.sim_name.iloc[:len(finished) - max_count])
+
+    return [sim_name for sim_name in finished.sim_name if sim_name in candidates]
+
+def apply_retention_policy(engine, archive_dir = None, max_age_days = None, max_count = None) -> dict:
+    #Archives every retention candidate, returns {sim_name: bundle path or the error that stopped it}
+    outcomes = {}
+    for sim_name in retention_candidates(engine, max_age_days, max_count):
+        try:
+            outcomes[sim_name] = str(archive_simulation(engine, sim_name, archive_dir))
+        except Exception as e:
+            print(f"Archiving {sim_name} failed: {e}")
+            outcomes[sim_name] = f'error: {e}'
+    return outcomes
+
+@st.cache_resource(show_spinner = "Loading archived simulation...")
+def open_bundle_engine(path):
+    """
+    Materializes the bundle into a local SQLite copy once per process and returns an engine on it,
+    so the dashboard queries run against the archived game unchanged. The copy is deleted once the
+    engine is released from the cache, or at the latest when the process exits.
+    """
+    manifest = read_manifest(path)
+    sim_name = manifest['sim_name']
+    bundle_dir = tempfile.TemporaryDirectory(prefix = f'{sim_name}_bundle_')
+    try:
+        writer = local_db.StandInWriter(bundle_dir.name)
+        with zipfile.ZipFile(path) as bundle:
+            for table in manifest['tables']:
+                df = _read_parquet(bundle, f"{table['layer']}/{table['table']}.parquet")
+                writer.write(df, f"{table['layer']}_{sim_name}", table['table'])
+            for table in manifest['reference_tables']:
+                writer.write(_read_parquet(bundle, f"initial_game_setups/{table['table']}.parquet"), 'initial_game_setups', table['table'])
+        writer.engine.dispose()
+    except Exception:
+        bundle_dir.cleanup()
+        raise
+
+    engine = create_engine(writer.url, execution_options = {db.ARCHIVE_BUNDLE_OPTION: str(path)})
+    #the finalizer keeps the directory alive as long as the engine and removes it with the engine
+    weakref.finalize(engine, bundle_dir.cleanup)
+    return engine
+
+def simulation_engine(db_engine, sim_name):
+    #Engine holding the simulation's tables: the bundle copy for archived games, db_engine otherwise
+    if sim_name is None:
+        return db_engine
+    registry = sql.get_simulation_registry(db_engine)
+    row = registry[registry.sim_name == sim_name]
+    if row.empty or row.status.iloc[0] != 'archived' or row.archive_path.iloc[0] is None:
+        return db_engine
+    return open_bundle_engine(row.archive_path.iloc[0])
@@ -0,0 +1,92 @@
+"""
+Capacity cube: player x asset_type x year -> generation / storage MW, split into established
+(online by that year and not yet retired) and pending (built but not yet online) capacity.
+
+The cube is computed once per simulation round and materialized submission (see
+sim_progress.materialize_asset_table) from a single asset read and served from cache,
+so the capacity charts only slice it instead of querying and pivoting on every rerun.
+"""
+import src.ems.functions.db as db
+import src.ems.functions.shared_state as shared_state
+import src.ems.functions.sql_queries as sql
+from src.ems.settings import get_settings
+import pandas as pd
+import streamlit as st
+
+def cube_years(current_round):
+    #Every round start year up to the year the next round's investments come online
+    settings = get_settings()
+    return [settings.round_to_year(round) for round in range(0, current_round + 2)]
+
+def build_capacity_cube(asset_df, years):
+    cube = asset_df.merge(pd.DataFrame({'year': years}), how = 'cross')
+    #retired assets (end_year reached) no longer count in that year
+    cube = cube[cube['year'] < cube['end_year']].copy()
+    cube['status'] = (cube['start_year'] <= cube['year']).map({True: 'Established', False: 'Pending'})
+    cube = cube.groupby(
+        by = ['player', 'asset_type', 'year', 'status'],
+        as_index = False
+    )[['generation_capacity', 'storage_capacity']].sum()
+    cube = cube.rename(columns = {'generation_capacity': 'generation_mw', 'storage_capacity': 'storage_mw'})
+    #Battery is sized by storage, every other technology by generation
+    cube['capacity_mw'] = cube['generation_mw'].where(cube['asset_type'] != 'Battery', cube['storage_mw'])
+
+    return cube
+
+@st.cache_data(show_spinner = False)
+def _cached_capacity_cube(_db_engine, _read_engine, sim_name, current_round, asset_version):
+    def load():
+        #the replica can lag the rows the materializer just wrote on the primary
+        engine = _read_engine
+        if sim_name is not None and engine is not _db_engine and len(sql.get_asset_watermark(engine, sim_name)) < asset_version:
+            engine = _db_engine
+        asset_df = sql.get_asset_capacity_table(engine, sim_name)
+        return build_capacity_cube(asset_df, cube_years(current_round))
+    return shared_state.cached(shared_state.cache_key('capacity_cube', sim_name, current_round, asset_version), load)
+
+def simulation_round(db_engine, sim_name):
+    #The default game setup (sim_name None) never advances past round 0
+    return 0 if sim_name is None else int(sql.get_current_round(db_engine, sim_name))
+
+def asset_version(db_engine, sim_name):
+    """
+    Number of submissions materialized into dim_asset_table, which change the cube within a round.
+    Read from the primary engine the materializer writes to, the replica may not have them yet.
+    """
+    return 0 if sim_name is None else len(sql.get_asset_watermark(db_engine, sim_name))
+
+def get_capacity_cube(db_engine, sim_name, current_round = None, version = None):
+    """
+    Returns the cube for the simulation's current round, the default game setup when sim_name is None.
+    current_round and version (see asset_version) are read from db_engine if not given.
+    """
+    if current_round is None:
+        current_round = simulation_round(db_engine, sim_name)
+    if version is None:
+        version = asset_version(db_engine, sim_name)
+    #the replica only serves the cube once it has the round's dim_asset_table
+    read_engine = db.route_read(db_engine, sim_name, current_round if sim_name is not None else None)
+    return _cached_capacity_cube(db_engine, read_engine, sim_name, current_round, version)
+
+def player_capacity_summary(cube, player, year):
+    """
+    Capacity per technology for one player in year, shaped for the investment summary bar:
+    online capacity as Established 'Yes', submitted builds not online yet as 'No'.
+    """
+    player_slice = cube[(cube['player'] == player) & (cube['year'] == year)]
+    summary = player_slice.groupby(['asset_type', 'status'], as_index = False)['capacity_mw'].sum()
+    summary['status'] = summary['status'].map({'Established': 'Yes', 'Pending': 'No'})
+    summary.columns = ['Asset Type', 'Established', 'Capacity']
+
+    return summary[['Asset Type', 'Capacity', 'Established']]
+
+def market_capacity_timeline(cube, asset_type, through_year):
+    """
+    Established market wide capacity of one technology for every cube year up to through_year.
+    Pass the year a round's builds come online to see the submitted builds in the last point.
+    """
+    years = [year for year in sorted(cube['year'].unique()) if year <= through_year]
+    tech_slice = cube[(cube['asset_type'] == asset_type) & (cube['status'] == 'Established')]
+    timeline = tech_slice.groupby('year')['capacity_mw'].sum()
+
+    return timeline.reindex(years, fill_value = 0.0)
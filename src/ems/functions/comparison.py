@@ -0,0 +1,93 @@
+"""
+Cross-simulation comparison.
+
+A comparison of S simulations over their finished rounds needs the same metric for S x R
+(simulation, round) pairs. Pairs already cached are served from the process cache (then the
+shared state backend), the missing ones are grouped into union all batches of COMPARISON_BATCH_SIZE
+selects and the batches run in parallel on the pooled connections. Finished rounds never change,
+so each pair is fetched once per metric.
+"""
+import src.ems.functions.shared_state as shared_state
+import src.ems.functions.sql_queries as sql
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pandas as pd
+import streamlit as st
+
+COMPARISON_BATCH_SIZE = 32
+COMPARISON_CONCURRENCY = 4
+MAX_CACHED_PAIRS = 4096
+
+class PairCache:
+    #LRU of one metric's rows per (metric, simulation, round), shared between sessions
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            rows = self._rows.get(key)
+            if rows is not None:
+                self._rows.move_to_end(key)
+            return rows
+
+    def put(self, key, rows):
+        with self._lock:
+            self._rows[key] = rows
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last = False)
+
+@st.cache_resource(show_spinner = False)
+def get_pair_cache():
+    return PairCache(MAX_CACHED_PAIRS)
+
+@st.cache_resource(show_spinner = False)
+def _batch_executor():
+    return ThreadPoolExecutor(max_workers = COMPARISON_CONCURRENCY, thread_name_prefix = 'comparison-batch')
+
+def finished_rounds(db_engine, sim_names) -> list:
+    #every (sim_name, round) pair with a finished round, rounds start at 1
+    return [
+        (sim_name, round)
+        for sim_name, current_round in sql.get_current_rounds(db_engine, sim_names).items()
+        for round in range(1, current_round + 1)
+    ]
+
+def _cached_pair(metric, sim_name, round):
+    key = shared_state.cache_key('comparison', metric, sim_name, round)
+    rows = get_pair_cache().get(key)
+    if rows is None and shared_state.get_backend().shared:
+        rows = shared_state.get_value(key)
+        if rows is not None:
+            get_pair_cache().put(key, rows)
+    return rows
+
+def _store_pair(metric, sim_name, round, rows):
+    key = shared_state.cache_key('comparison', metric, sim_name, round)
+    get_pair_cache().put(key, rows)
+    if shared_state.get_backend().shared:
+        shared_state.set_value(key, rows)
+
+def get_comparison(db_engine, metric, sim_names):
+    """
+    Returns the metric for every finished round of each simulation, one frame tagged with
+    sim_name and round (see sql.COMPARISON_QUERIES for the metric columns).
+    """
+    pairs = finished_rounds(db_engine, sim_names)
+    cached = {pair: _cached_pair(metric, *pair) for pair in pairs}
+    missing = [pair for pair, rows in cached.items() if rows is None]
+
+    batches = [missing[start:start + COMPARISON_BATCH_SIZE] for start in range(0, len(missing), COMPARISON_BATCH_SIZE)]
+    for batch_result in _batch_executor().map(lambda batch: sql.get_comparison_batch(db_engine, metric, batch), batches):
+        for (sim_name, round), rows in batch_result.groupby(['sim_name', 'round']):
+            rows = rows.reset_index(drop = True)
+            cached[(sim_name, round)] = rows
+            _store_pair(metric, sim_name, round, rows)
+
+    frames = [rows for rows in cached.values() if rows is not None]
+    if not frames:
+        return pd.DataFrame(columns = ['sim_name', 'round'])
+    return pd.concat(frames, ignore_index = True)
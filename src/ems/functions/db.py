@@ -0,0 +1,198 @@
+import src.ems.functions.sql_queries as sql
+from src.ems.settings import get_settings
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+import threading
+import urllib
+
+CANCEL_POLL_INTERVAL = 0.1
+#execution option set on engines that serve an archived simulation from its bundle copy
+ARCHIVE_BUNDLE_OPTION = 'archive_bundle'
+
+class StaleRequestError(Exception):
+    """
+    Raised in place of a query result when the streamlit rerun that issued the query has been
+    superseded by a newer one (slider dragged, date range changed) and the query was cancelled.
+    """
+
+#latest dbapi cursor of each thread running a cancellable query, kept until its rows are fetched
+_running_cursors = {}
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _track_cursor(conn, cursor, statement, parameters, context, executemany):
+    thread_id = threading.get_ident()
+    if thread_id in _running_cursors:
+        _running_cursors[thread_id] = cursor
+
+def _set_query_timeout(dbapi_connection, connection_record):
+    #pyodbc applies connection.timeout as the statement timeout of every cursor it creates
+    if hasattr(dbapi_connection, 'timeout'):
+        dbapi_connection.timeout = get_settings().query_timeout
+
+def _create_engine_from_secrets(prefix):
+    if f'{prefix}_URL' in st.secrets:
+        #Full sqlalchemy url, used to point the app at a local stand-in database
+        return create_engine(st.secrets[f'{prefix}_URL'])
+
+    #a read replica only needs its own server, everything else defaults to the primary's
+    server = st.secrets.get(f'{prefix}_SERVER', st.secrets.get('DB_SERVER'))
+    driver = st.secrets.get(f'{prefix}_DRIVER', st.secrets.get('DB_DRIVER'))
+    database = st.secrets.get(f'{prefix}_DATABASE', st.secrets.get('DB_DATABASE'))
+    username = st.secrets.get(f'{prefix}_USERNAME', st.secrets.get('DB_USERNAME'))
+    password = st.secrets.get(f'{prefix}_PASSWORD', st.secrets.get('DB_PASSWORD'))
+    db_params_tmp = 'DRIVER=' + driver + ';SERVER=' + server + ';PORT=1433;DATABASE=' + database + ';UID=' + username + ';PWD=' + password
+    db_params = urllib.parse.quote_plus(db_params_tmp)
+    return create_engine("mssql+pyodbc:///?odbc_connect={}".format(db_params), fast_executemany = True)
+
+@st.cache_resource(show_spinner = False)
+def postgres_connect():
+    """
+    Returns the process wide primary engine, so reruns and sessions share one connection pool
+    instead of building a new engine on every rerun. All writes go to this engine.
+    The simulation registry is created here, registry reads on either engine don't create it.
+    """
+    engine = _create_engine_from_secrets('DB')
+    event.listen(engine, 'connect', _set_query_timeout)
+    sql.ensure_simulation_registry(engine)
+    return engine
+
+@st.cache_resource(show_spinner = False)
+def maintenance_connect():
+    """
+    Returns a primary engine without the statement timeout, for facilitator maintenance such as
+    building result table indexes, which can run far longer than a dashboard query may.
+    """
+    engine = _create_engine_from_secrets('DB')
+    sql.ensure_simulation_registry(engine)
+    return engine
+
+@st.cache_resource(show_spinner = False)
+def read_replica_connect():
+    """
+    Returns the read replica engine configured with DB_READ_URL or DB_READ_SERVER, None if the
+    app runs against the primary only.
+    """
+    if 'DB_READ_URL' not in st.secrets and 'DB_READ_SERVER' not in st.secrets:
+        return None
+    engine = _create_engine_from_secrets('DB_READ')
+    event.listen(engine, 'connect', _set_query_timeout)
+    return engine
+
+class ReplicaFreshness:
+    """
+    Highest round seen on the replica per simulation. Rounds only ever advance, so once the
+    replica has shown a round it is known fresh for that round and every earlier one.
+    """
+
+    def __init__(self):
+        self._rounds = {}
+        self._lock = threading.Lock()
+
+    def is_fresh(self, replica_engine, sim_name, min_round):
+        with self._lock:
+            if self._rounds.get(sim_name, -1) >= min_round:
+                return True
+        replica_round = int(sql.get_current_round(replica_engine, sim_name))
+        with self._lock:
+            self._rounds[sim_name] = max(self._rounds.get(sim_name, -1), replica_round)
+            return self._rounds[sim_name] >= min_round
+
+@st.cache_resource(show_spinner = False)
+def _replica_freshness():
+    return ReplicaFreshness()
+
+def is_archive_engine(engine) -> bool:
+    return ARCHIVE_BUNDLE_OPTION in engine.get_execution_options()
+
+def route_read(primary_engine, sim_name = None, min_round = None):
+    """
+    Returns the engine a read should go to: the read replica when one is configured and, for
+    round results, it already has min_round of sim_name, otherwise the primary. Writes and reads
+    that must see the latest state (current round, submissions) use the primary directly.
+    args:
+        - primary_engine: engine from postgres_connect(), returned when the replica can't serve the read
+        - sim_name, min_round: freshness guard, the replica must have completed min_round of sim_name
+    """
+    if is_archive_engine(primary_engine):
+        #an archived game only exists in its bundle copy
+        return primary_engine
+    replica_engine = read_replica_connect()
+    if replica_engine is None:
+        return primary_engine
+    if sim_name is None or min_round is None:
+        return replica_engine
+    try:
+        fresh = _replica_freshness().is_fresh(replica_engine, sim_name, int(min_round))
+    except Exception as e:
+        print(f"Read replica freshness check for {sim_name} failed, reading from primary: {e}")
+        return primary_engine
+
+    return replica_engine if fresh else primary_engine
+
+def _cancel(thread_id):
+    cursor = _running_cursors.get(thread_id)
+    if cursor is None:
+        return
+    if hasattr(cursor, 'cancel'):
+        #pyodbc: SQLCancel, safe to call from another thread
+        cursor.cancel()
+    elif hasattr(getattr(cursor, 'connection', None), 'interrupt'):
+        #sqlite3 (local stand-in)
+        cursor.connection.interrupt()
+
+#streamlit releases whose ScriptRequests internals _rerun_requested was checked against (min, max), inclusive
+RERUN_CHECK_VERSIONS = ((1, 37), (1, 41))
+
+def _streamlit_version():
+    return tuple(int(part) for part in st.__version__.split('.')[:2])
+
+def _rerun_requested(ctx):
+    """
+    True once the server thread has queued a rerun or stop for the session. The script thread only
+    sees it at its next streamlit call, so while it waits on a query the request is read from the
+    run context's ScriptRequests, which is not public API: outside RERUN_CHECK_VERSIONS, or if the
+    attributes are missing, this reports False and queries simply run to completion.
+    """
+    if not RERUN_CHECK_VERSIONS[0] <= _streamlit_version() <= RERUN_CHECK_VERSIONS[1]:
+        return False
+    state = getattr(getattr(ctx, 'script_requests', None), '_state', None)
+    return getattr(state, 'value', None) in ('RERUN', 'STOP')
+
+@st.cache_resource(show_spinner = False)
+def _query_executor():
+    return ThreadPoolExecutor(max_workers = 16, thread_name_prefix = 'cancellable-query')
+
+def run_cancellable(query_function, *args, **kwargs):
+    """
+    Runs query_function(*args, **kwargs) on a worker thread while the script thread watches for
+    its rerun being superseded. If a newer rerun is requested first (see _rerun_requested), the
+    in-flight statement or fetch is cancelled on the server, its pooled connection freed, and
+    StaleRequestError is raised.
+    Outside a streamlit script run (e.g. background warm-up) the function is called directly.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return query_function(*args, **kwargs)
+
+    worker = {}
+    def run():
+        thread_id = threading.get_ident()
+        worker['thread_id'] = thread_id
+        #cursors stay cancellable until query_function has read all its rows
+        _running_cursors[thread_id] = None
+        try:
+            return query_function(*args, **kwargs)
+        finally:
+            _running_cursors.pop(thread_id, None)
+
+    future = _query_executor().submit(run)
+    while True:
+        try:
+            return future.result(timeout = CANCEL_POLL_INTERVAL)
+        except TimeoutError:
+            if _rerun_requested(ctx):
+                _cancel(worker.get('thread_id'))
+                raise StaleRequestError(f"{query_function.__name__} superseded by a newer rerun") from None
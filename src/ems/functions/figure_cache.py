@@ -0,0 +1,67 @@
+"""
+Process wide cache of serialized plotly figures.
+
+Figures for data that no longer changes (finished rounds, a round's capacity cube) are keyed by
+(simulation, round, chart, parameters) and stored as figure JSON, so reruns and other sessions
+rebuild them from the spec instead of re-running the queries and traces behind them.
+"""
+from collections import OrderedDict
+import threading
+import streamlit as st
+
+MAX_CACHED_FIGURES = 512
+#Above this many points a time series is drawn with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 5000
+
+class FigureStore:
+    #LRU of figure JSON strings, shared between sessions
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            figure_json = self._figures.get(key)
+            if figure_json is not None:
+                self._figures.move_to_end(key)
+            return figure_json
+
+    def put(self, key, figure_json):
+        with self._lock:
+            self._figures[key] = figure_json
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last = False)
+
+@st.cache_resource(show_spinner = False)
+def get_figure_store():
+    return FigureStore(MAX_CACHED_FIGURES)
+
+def cached_figure(key, build_figure):
+    """
+    Returns the figure cached under key, building and caching it with build_figure() on a miss.
+    args:
+        - key: hashable (simulation, round, chart, parameters...) tuple, None disables caching
+        - build_figure: callable returning a plotly figure
+    """
+    if key is None:
+        return build_figure()
+
+    import plotly.io as pio
+
+    store = get_figure_store()
+    figure_json = store.get(key)
+    if figure_json is not None:
+        return pio.from_json(figure_json)
+
+    fig = build_figure()
+    store.put(key, fig.to_json())
+    return fig
+
+def scatter_trace(x, y, **kwargs):
+    #go.Scatter for small series, go.Scattergl once the series is large enough to stall SVG rendering
+    import plotly.graph_objects as go
+
+    trace = go.Scattergl if len(x) > WEBGL_POINT_THRESHOLD else go.Scatter
+    return trace(x = x, y = y, **kwargs)
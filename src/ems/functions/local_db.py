@@ -0,0 +1,268 @@
+"""
+Local SQLite copy of the simulation SQL Server database, used as the load-test stand-in and to
+replay archived simulations from their bundle.
+
+Every schema (initial_game_setups, raw_/stage_/warehouse_/mart_{sim}) is a separate SQLite file
+attached under its schema name, so the app's `schema.table` and `[schema].[table]` queries run
+unchanged. The catalog views the app reads (sys.schemas, sys.tables, sys.views, INFORMATION_SCHEMA.TABLES
+and .COLUMNS) are plain tables kept in sync by the seeding code, and the T-SQL string functions used by
+the catalog queries are registered as SQLite functions.
+"""
+import numpy as np
+import pandas as pd
+import pathlib
+import sqlite3
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import Pool
+
+CATALOG_SCHEMAS = ['sys', 'information_schema']
+PLAYERS = ['RedCo', 'BlueCo', 'GreenCo', 'YellowCo', 'PurpleCo', 'OrangeCo']
+INVESTMENT_OPTIONS = pd.DataFrame(
+    data = {
+        'asset_type': ['Gas', 'Solar', 'Wind', 'Battery'],
+        'max_build': [3, 5, 5, 4],
+        'generation_capacity': [300.0, 100.0, 150.0, 0.0],
+        'storage_capacity': [0.0, 0.0, 0.0, 200.0],
+        'vom': [4.0, 0.0, 0.0, 1.0],
+        'fuel_cost': [35.0, 0.0, 0.0, 0.0],
+        'life_span': [30, 25, 25, 15],
+    }
+)
+
+_installed_dirs = set()
+
+def _charindex(substring, string):
+    if substring is None or string is None:
+        return None
+    return string.find(substring) + 1
+
+def _right(string, length):
+    if string is None or length is None:
+        return None
+    return string[-length:] if length > 0 else ''
+
+def _reverse(string):
+    return None if string is None else string[::-1]
+
+def _object_id_function(dbapi_connection):
+    #OBJECT_ID('schema.table', 'U'): non null when the table exists in the attached schema file
+    def object_id(name, object_type = 'U'):
+        schema, _, table = name.replace('[', '').replace(']', '').rpartition('.')
+        try:
+            found = dbapi_connection.execute(
+                f"select 1 from {schema or 'main'}.sqlite_master where type = 'table' and name = ?", (table,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return 1 if found else None
+    return object_id
+
+def _attach_schemas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    main_file = dbapi_connection.execute('pragma database_list').fetchone()[2]
+    db_dir = str(pathlib.Path(main_file).parent) if main_file else None
+    if db_dir not in _installed_dirs:
+        return
+
+    dbapi_connection.execute('pragma busy_timeout = 30000')
+    dbapi_connection.create_function('CHARINDEX', 2, _charindex, deterministic = True)
+    dbapi_connection.create_function('RIGHT', 2, _right, deterministic = True)
+    dbapi_connection.create_function('REVERSE', 1, _reverse, deterministic = True)
+    dbapi_connection.create_function('OBJECT_ID', 2, _object_id_function(dbapi_connection))
+    for schema_file in sorted(pathlib.Path(db_dir).glob('*.db')):
+        if schema_file.stem != 'main':
+            dbapi_connection.execute(f"attach database '{schema_file}' as {schema_file.stem}")
+
+def install(db_dir) -> str:
+    """
+    Registers the stand-in directory so every new SQLite connection to it attaches the schema
+    files, then returns the sqlalchemy url to hand to the app as the DB_URL secret.
+    """
+    db_dir = pathlib.Path(db_dir).resolve()
+    db_dir.mkdir(parents = True, exist_ok = True)
+    if not _installed_dirs:
+        event.listen(Pool, 'connect', _attach_schemas)
+    _installed_dirs.add(str(db_dir))
+
+    #schema files must exist before the first connection attaches them
+    for schema in CATALOG_SCHEMAS + ['main', 'initial_game_setups']:
+        sqlite3.connect(db_dir / f'{schema}.db').close()
+    with sqlite3.connect(db_dir / 'main.db') as con:
+        con.execute('pragma journal_mode = wal')
+
+    return f'sqlite:///{db_dir / "main.db"}'
+
+def _column_type(dtype):
+    #INFORMATION_SCHEMA (data_type, character_maximum_length) of a column as pandas.to_sql creates it on SQL Server
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bit', None
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'bigint', None
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float', None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime', None
+    return 'varchar', -1
+
+def add_schema(db_dir, schema) -> None:
+    #Attached on the next new connection, create schemas before the engine is used
+    sqlite3.connect(pathlib.Path(db_dir) / f'{schema}.db').close()
+
+class StandInWriter:
+    """
+    Writes tables into the stand-in and registers them in the fake catalog views.
+    """
+
+    def __init__(self, db_dir):
+        self.url = install(db_dir)
+        self.db_dir = pathlib.Path(db_dir).resolve()
+        self.engine = create_engine(self.url)
+        self._schema_ids = {}
+        with self.engine.begin() as con:
+            con.exec_driver_sql('create table if not exists sys.schemas (schema_id integer, name text)')
+            con.exec_driver_sql('create table if not exists sys.tables (name text, schema_id integer)')
+            #the stand-in holds no views, the catalog is there for queries that list them
+            con.exec_driver_sql('create table if not exists sys.views (name text, schema_id integer)')
+            con.exec_driver_sql('create table if not exists information_schema.tables (TABLE_SCHEMA text, TABLE_NAME text)')
+            #lower case names, SQLite labels result columns with the declared name and the app reads them lower case
+            con.exec_driver_sql(
+                'create table if not exists information_schema.columns '
+                '(table_schema text, table_name text, column_name text, ordinal_position integer, '
+                'data_type text, character_maximum_length integer, is_nullable text)'
+            )
+
+    def create_schema(self, schema):
+        if schema in self._schema_ids:
+            return
+        add_schema(self.db_dir, schema)
+        #new schema files are only attached by new connections
+        self.engine.dispose()
+        self._schema_ids[schema] = len(self._schema_ids) + 1
+        with self.engine.begin() as con:
+            con.exec_driver_sql(
+                'insert into sys.schemas (schema_id, name) values (?, ?)',
+                (self._schema_ids[schema], schema)
+            )
+
+    def write(self, df, schema, table, index = False):
+        self.create_schema(schema)
+        df.to_sql(name = table, con = self.engine, schema = schema, if_exists = 'replace', index = index)
+        with self.engine.begin() as con:
+            con.exec_driver_sql('delete from sys.tables where name = ? and schema_id = ?', (table, self._schema_ids[schema]))
+            con.exec_driver_sql('insert into sys.tables (name, schema_id) values (?, ?)', (table, self._schema_ids[schema]))
+            con.exec_driver_sql('delete from information_schema.tables where TABLE_SCHEMA = ? and TABLE_NAME = ?', (schema, table))
+            con.exec_driver_sql('insert into information_schema.tables (TABLE_SCHEMA, TABLE_NAME) values (?, ?)', (schema, table))
+            con.exec_driver_sql('delete from information_schema.columns where table_schema = ? and table_name = ?', (schema, table))
+            columns = ([('index', df.index.dtype)] if index else []) + list(df.dtypes.items())
+            con.exec_driver_sql(
+                'insert into information_schema.columns values (?, ?, ?, ?, ?, ?, ?)',
+                [(schema, table, str(name), position, *_column_type(dtype), 'YES') for position, (name, dtype) in enumerate(columns, start = 1)]
+            )
+
+def _asset_table(players, start_year, rng):
+    rows = []
+    for player in players:
+        for asset_type, capacity in [('Coal', 600.0), ('Gas', 300.0), ('Solar', 100.0), ('Battery', 0.0)]:
+            rows.append({
+                'asset_name': f'{player}_{start_year}_{asset_type}_A',
+                'player': player,
+                'asset_type': asset_type,
+                'generation_capacity': capacity,
+                'storage_capacity': 200.0 if asset_type == 'Battery' else 0.0,
+                'vom': float(rng.uniform(0, 5)),
+                'fuel_cost': float(rng.uniform(20, 60)) if asset_type in ['Coal', 'Gas'] else 0.0,
+                'capital_cost': float(rng.uniform(1e6, 5e6)),
+                'start_year': start_year,
+                'end_year': start_year + 30,
+            })
+    return pd.DataFrame(rows)
+
+def seed(db_dir, sim_name = 'loadtest', rounds = 3, players = PLAYERS, hours = 24*7, start_year = 2025, years_per_simulation = 5, random_seed = 0):
+    """
+    Seeds the stand-in with the reference tables in initial_game_setups and one simulation with
+    `rounds` completed rounds of result tables. Returns the DB_URL for the app.
+    """
+    rng = np.random.default_rng(random_seed)
+    writer = StandInWriter(db_dir)
+    techs = list(INVESTMENT_OPTIONS.asset_type) + ['Coal']
+    years = [start_year + n*years_per_simulation for n in range(rounds + 3)]
+
+    #reference tables
+    writer.write(
+        pd.DataFrame({'player': players, 'description': [f'{player} is a generation company.' for player in players]}),
+        'initial_game_setups', 'player_table'
+    )
+    writer.write(INVESTMENT_OPTIONS, 'initial_game_setups', 'investment_table')
+    writer.write(INVESTMENT_OPTIONS[['asset_type', 'life_span']], 'initial_game_setups', 'asset_life_table')
+    writer.write(
+        pd.DataFrame({'asset_type': INVESTMENT_OPTIONS.asset_type} | {str(n): rng.uniform(1e6, 5e6, len(INVESTMENT_OPTIONS)) for n in range(rounds + 3)}),
+        'initial_game_setups', 'capital_cost_table'
+    )
+    writer.write(
+        pd.DataFrame({'asset_type': techs} | {str(year): rng.uniform(0, 2000, len(techs)).round() for year in years}),
+        'initial_game_setups', 'target_table', index = True
+    )
+    initial_assets = _asset_table(players, start_year, rng)
+    writer.write(initial_assets, 'initial_game_setups', 'asset_table', index = True)
+    writer.write(
+        pd.DataFrame({
+            'sim_name': [sim_name],
+            'created_at': [pd.Timestamp.now(tz = 'UTC').tz_localize(None)],
+            'round_count': [rounds],
+            'player_count': [len(players)],
+            'status': ['in_progress'],
+            'archive_path': [None],
+        }),
+        'initial_game_setups', 'simulation_registry'
+    )
+
+    #simulation schemas
+    for layer in ['raw', 'stage', 'warehouse']:
+        writer.create_schema(f'{layer}_{sim_name}')
+    writer.write(initial_assets, f'mart_{sim_name}', 'dim_asset_table', index = True)
+
+    datetimes = pd.date_range(f'{start_year}-01-01', periods = hours, freq = 'h')
+    asset_types = ['Coal', 'Gas', 'Solar', 'Battery']
+    for round in range(0, rounds + 2):
+        if round >= 1 and round <= rounds:
+            writer.write(pd.DataFrame({'asset_name': initial_assets.asset_name, 'value': rng.uniform(0, 1, len(initial_assets))}), f'mart_{sim_name}', f'fct_asset_result_{round}')
+
+        player_asset = pd.MultiIndex.from_product([players, asset_types], names = ['player', 'asset_type']).to_frame(index = False)
+        n = len(player_asset)
+        reporting = player_asset.assign(
+            annual_dispatch_revenue = rng.uniform(1e6, 1e7, n),
+            annual_subsidy_revenue = rng.uniform(0, 1e6, n),
+            annual_capital_cost = rng.uniform(1e5, 1e6, n),
+            annual_vom_cost = rng.uniform(1e4, 1e5, n),
+            annual_fuel_cost = rng.uniform(1e5, 2e6, n),
+            max_capacity = rng.uniform(100, 600, n),
+            actual_capacity = rng.uniform(50, 500, n),
+            weighted_avg_price = rng.uniform(30, 120, n),
+            summed_value_mwh = rng.uniform(1e4, 1e6, n),
+        )
+        writer.write(reporting, f'mart_{sim_name}', f'reporting_sim_result_{round}')
+        writer.write(reporting[['player', 'asset_type', 'summed_value_mwh', 'weighted_avg_price']], f'mart_{sim_name}', f'rpt_asset_outcome_summary_{round}')
+        writer.write(
+            reporting.groupby('player', as_index = False)[['annual_dispatch_revenue', 'annual_subsidy_revenue', 'annual_capital_cost', 'annual_vom_cost', 'annual_fuel_cost']].sum(),
+            f'mart_{sim_name}', f'rpt_financial_outcome_summary_{round}'
+        )
+        writer.write(
+            pd.concat([
+                pd.DataFrame({'datetime': datetimes, 'value_type': value_type, 'value': rng.uniform(0, 200, hours)})
+                for value_type in ['price', 'demand']
+            ]),
+            f'mart_{sim_name}', f'fct_mkt_result_{round}'
+        )
+        writer.write(
+            pd.concat([
+                pd.DataFrame({'datetime': datetimes, 'value_type': value_type, 'player': player, 'asset_type': asset_type, 'value': rng.uniform(0, 600, hours)})
+                for value_type in ['q', 'q_st', 'q_ch']
+                for player in players
+                for asset_type in asset_types
+            ]),
+            f'mart_{sim_name}', f'rpt_grouped_dispatch_detail_{round}'
+        )
+
+    writer.engine.dispose()
+    return writer.url
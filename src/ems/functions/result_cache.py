@@ -0,0 +1,123 @@
+"""
+Cached reads of finished round results, shared by every session of the process.
+
+A round's mart tables are written once when the round completes and never change afterwards,
+so they are cached on (simulation, round) and the cache can be warmed ahead of the first viewer
+by RoundWarmer as soon as a new round is found. Reads issued from a rerun go through
+db.run_cancellable, so a superseded rerun cancels its query instead of holding a connection.
+"""
+import src.ems.functions.db as db
+import src.ems.functions.shared_state as shared_state
+import src.ems.functions.sql_queries as sql
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import streamlit as st
+
+#date range covering every hour of a round, used when the whole market result is cached
+FULL_ROUND = ('1900-01-01', '9999-12-31')
+MAX_CACHED_ROUNDS = 256
+#reporting columns the result dashboard charts use, the rest of the table is never sent
+REPORTING_COLUMNS = [
+    'player',
+    'asset_type',
+    'annual_dispatch_revenue',
+    'annual_subsidy_revenue',
+    'annual_capital_cost',
+    'annual_vom_cost',
+    'annual_fuel_cost',
+    'max_capacity',
+    'actual_capacity',
+    'weighted_avg_price',
+    'summed_value_mwh',
+]
+WARMUP_CONCURRENCY = 4
+
+def _load(query_function, _engine, sim_name, round, *args, **kwargs):
+    #per process st.cache_data miss: try the replicas' shared cache before querying
+    key = shared_state.cache_key('result', query_function.__name__, sim_name, round, *args, *sorted(kwargs.items()))
+    return shared_state.cached(key, lambda: db.run_cancellable(query_function, _engine, sim_name, round, *args, **kwargs))
+
+@st.cache_data(show_spinner = False, max_entries = MAX_CACHED_ROUNDS)
+def get_reporting_table(_engine, sim_name, round):
+    return _load(sql.get_reporting_table, _engine, sim_name, round, columns = REPORTING_COLUMNS)
+
+@st.cache_data(show_spinner = False, max_entries = MAX_CACHED_ROUNDS)
+def get_market_price(_engine, sim_name, round, date_range = FULL_ROUND):
+    return _load(sql.get_market_price, _engine, sim_name, round, date_range)
+
+@st.cache_data(show_spinner = False, max_entries = MAX_CACHED_ROUNDS)
+def get_market_demand(_engine, sim_name, round, date_range = FULL_ROUND):
+    return _load(sql.get_market_demand, _engine, sim_name, round, date_range)
+
+@st.cache_data(show_spinner = False, max_entries = MAX_CACHED_ROUNDS)
+def get_grouped_dispatch_result(_engine, sim_name, round, date_range = FULL_ROUND):
+    return _load(sql.get_grouped_dispatch_result, _engine, sim_name, round, date_range, columns = sql.DISPATCH_COLUMNS, filters = sql.DISPATCH_FILTERS)
+
+@st.cache_data(show_spinner = False, max_entries = MAX_CACHED_ROUNDS)
+def get_round_delta_report(_engine, sim_name, round):
+    #both rounds of the pair are finished, so the delta never changes once computed
+    return _load(sql.get_round_delta_report, _engine, sim_name, round)
+
+#the loaders the result dashboard calls for a round, warmed with the same arguments so the pages hit the warm keys
+WARMUP_LOADERS = [
+    get_reporting_table,
+    get_market_price,
+    get_market_demand,
+    get_grouped_dispatch_result,
+]
+#a round delta needs the round before it, there is none for round 1
+DELTA_WARMUP_LOADERS = [
+    get_round_delta_report,
+]
+
+class RoundWarmer:
+    """
+    Pre-loads a new round's result tables into the cache on a bounded thread pool.
+    Each (simulation, round) is warmed at most once at a time; a round whose tables were not all
+    readable yet (the pipeline is still writing them) can be warmed again on the next check.
+    """
+
+    def __init__(self, max_workers: int = WARMUP_CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'round-warmer')
+        self._lock = threading.Lock()
+        self._warmed = set()
+        self._in_flight = set()
+
+    def warm(self, engine, sim_name, round) -> bool:
+        #Returns False without scheduling anything if the round is already warm or warming
+        key = (sim_name, int(round))
+        with self._lock:
+            if key in self._warmed or key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+
+        threading.Thread(
+            target = self._warm,
+            args = (key, engine),
+            name = f'round-warmer-{sim_name}-{round}',
+            daemon = True
+        ).start()
+        return True
+
+    def _warm(self, key, engine):
+        sim_name, round = key
+        read_engine = db.route_read(engine, sim_name, round)
+        loaders = WARMUP_LOADERS + (DELTA_WARMUP_LOADERS if round >= 2 else [])
+        futures = [self._executor.submit(loader, read_engine, sim_name, round) for loader in loaders]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        with self._lock:
+            self._in_flight.discard(key)
+            if not errors:
+                self._warmed.add(key)
+        if errors:
+            print(f"Warming {sim_name} round {round} incomplete: {errors[0]}")
+
+@st.cache_resource(show_spinner = False)
+def get_round_warmer():
+    return RoundWarmer()
+
+def warm_latest_round(engine, sim_name, current_round):
+    #Cheap check on every dashboard load: only schedules work the first time a round is seen
+    if sim_name is None or current_round < 1 or db.is_archive_engine(engine):
+        return False
+    return get_round_warmer().warm(engine, sim_name, current_round)
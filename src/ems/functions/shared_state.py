@@ -0,0 +1,253 @@
+"""
+Shared state and cache backend, so several app replicas can serve the same class without sticky sessions.
+
+Pending investment selections, submission status and cached query results are kept in a key/value
+backend chosen with STATE_BACKEND:
+    - memory: in-process dict, the default for a single process
+    - disk: SQLite file at STATE_URL, shared by every worker process on one host
+    - redis: any Redis protocol server at STATE_URL (redis://...), shared across hosts
+Values are pickled, the backend must only be reachable by the app. Selections are stored one field
+per technology (a Redis hash), so concurrent changes to different technologies never overwrite
+each other.
+"""
+from src.ems.settings import get_settings
+import pickle
+import sqlite3
+from contextlib import contextmanager
+import threading
+import time
+import streamlit as st
+
+#unsubmitted selections of an abandoned game are dropped after a day
+SELECTION_TTL = 24*3600
+#the disk backend drops expired entries, then the oldest ones beyond DISK_MAX_ENTRIES, every DISK_EVICT_INTERVAL seconds
+DISK_MAX_ENTRIES = 10_000
+DISK_EVICT_INTERVAL = 60
+
+class MemoryBackend:
+    #Per-process dict with expiry, state is not shared with other processes
+    shared = False
+
+    def __init__(self):
+        self._values = {}
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._values.get(key, (None, None))
+            if expires_at is not None and expires_at < time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value: bytes, ttl = None):
+        with self._lock:
+            self._values[key] = (value, None if ttl is None else time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._fields.pop(key, None)
+
+    def get_fields(self, key) -> dict:
+        with self._lock:
+            fields, expires_at = self._fields.get(key, ({}, None))
+            if expires_at is not None and expires_at < time.time():
+                del self._fields[key]
+                return {}
+            return dict(fields)
+
+    def set_field(self, key, field, value: bytes, ttl = None):
+        with self._lock:
+            fields, _ = self._fields.get(key, ({}, None))
+            fields[field] = value
+            self._fields[key] = (fields, None if ttl is None else time.time() + ttl)
+
+class DiskBackend:
+    """
+    SQLite key/value table, WAL mode so worker processes read while another writes.
+    Expired entries and the oldest entries beyond max_entries are evicted as the backend is written.
+    """
+    shared = True
+
+    def __init__(self, path, max_entries = DISK_MAX_ENTRIES, evict_interval = DISK_EVICT_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._last_evicted = 0
+        with self._connect() as con:
+            con.execute('pragma journal_mode = wal')
+            con.execute('create table if not exists shared_state (key text primary key, value blob not null, expires_at real)')
+            con.execute(
+                'create table if not exists shared_state_fields '
+                '(key text not null, field text not null, value blob not null, expires_at real, primary key (key, field))'
+            )
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout = 30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def get(self, key):
+        with self._connect() as con:
+            row = con.execute(
+                'select value from shared_state where key = ? and (expires_at is null or expires_at >= ?)',
+                (key, time.time())
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value: bytes, ttl = None):
+        with self._connect() as con:
+            con.execute(
+                'insert or replace into shared_state (key, value, expires_at) values (?, ?, ?)',
+                (key, value, None if ttl is None else time.time() + ttl)
+            )
+        self._maybe_evict()
+
+    def delete(self, key):
+        with self._connect() as con:
+            con.execute('delete from shared_state where key = ?', (key,))
+            con.execute('delete from shared_state_fields where key = ?', (key,))
+
+    def get_fields(self, key) -> dict:
+        with self._connect() as con:
+            rows = con.execute(
+                'select field, value from shared_state_fields where key = ? and (expires_at is null or expires_at >= ?)',
+                (key, time.time())
+            ).fetchall()
+        return dict(rows)
+
+    def set_field(self, key, field, value: bytes, ttl = None):
+        #one row per field, so concurrent writers of other fields never lose each other's
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._connect() as con:
+            con.execute(
+                'insert or replace into shared_state_fields (key, field, value, expires_at) values (?, ?, ?, ?)',
+                (key, field, value, expires_at)
+            )
+            #the fields of a key expire together
+            con.execute('update shared_state_fields set expires_at = ? where key = ?', (expires_at, key))
+        self._maybe_evict()
+
+    def _maybe_evict(self):
+        now = time.time()
+        if now - self._last_evicted < self.evict_interval:
+            return
+        self._last_evicted = now
+        with self._connect() as con:
+            con.execute('delete from shared_state where expires_at < ?', (now,))
+            con.execute('delete from shared_state_fields where expires_at < ?', (now,))
+            #insert or replace re-inserts a written key, so the lowest rowids are the least recently written
+            excess = con.execute('select count(*) from shared_state').fetchone()[0] - self.max_entries
+            if excess > 0:
+                con.execute('delete from shared_state where rowid in (select rowid from shared_state order by rowid limit ?)', (excess,))
+
+class RedisBackend:
+    """
+    Redis protocol backend. Takes a redis:// url, or an already built client exposing
+    get/set/delete/hgetall/hset/expire (e.g. a local stand-in server's client in tests).
+    """
+    shared = True
+
+    def __init__(self, url = None, client = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("STATE_BACKEND=redis needs the redis package, install it with `pip install redis`") from None
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value: bytes, ttl = None):
+        self.client.set(key, value, ex = None if ttl is None else int(ttl))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_fields(self, key) -> dict:
+        return {
+            field.decode() if isinstance(field, bytes) else field: value
+            for field, value in self.client.hgetall(key).items()
+        }
+
+    def set_field(self, key, field, value: bytes, ttl = None):
+        #HSET only writes the one field, concurrent writers of other fields are never overwritten
+        self.client.hset(key, field, value)
+        if ttl is not None:
+            self.client.expire(key, int(ttl))
+
+BACKENDS = {
+    'memory': lambda url: MemoryBackend(),
+    'disk': lambda url: DiskBackend(url),
+    'redis': lambda url: RedisBackend(url),
+}
+
+@st.cache_resource(show_spinner = False)
+def get_backend():
+    settings = get_settings()
+    return BACKENDS[settings.state_backend](settings.state_url)
+
+def get_value(key, default = None):
+    value = get_backend().get(key)
+    return default if value is None else pickle.loads(value)
+
+def set_value(key, value, ttl = None):
+    get_backend().set(key, pickle.dumps(value), ttl)
+
+def cached(key, load, ttl = None):
+    """
+    Returns the value cached under key in the shared backend, loading and storing it with load()
+    on a miss. Only for immutable results (a finished round) unless a ttl is given. A backend
+    failure falls back to load(), the shared cache is an optimization only. With the memory
+    backend load() is called directly, the caller's st.cache_data already caches per process.
+    """
+    backend = get_backend()
+    if not backend.shared:
+        return load()
+    try:
+        value = backend.get(key)
+    except Exception as e:
+        print(f"Shared cache read of {key} failed: {e}")
+        value = None
+    if value is not None:
+        return pickle.loads(value)
+
+    result = load()
+    try:
+        backend.set(key, pickle.dumps(result), ttl)
+    except Exception as e:
+        print(f"Shared cache write of {key} failed: {e}")
+    return result
+
+def cache_key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+def get_selection(sim_name, player) -> dict:
+    """
+    {technology: quantity} the player has selected for the simulation but not yet submitted.
+    A player is one team, every session of the team shares its selection.
+    """
+    fields = get_backend().get_fields(cache_key('selection', sim_name, player))
+    return {tech: pickle.loads(value) for tech, value in fields.items()}
+
+def set_selection(sim_name, player, tech, quantity) -> None:
+    #only the technology's own field is written, see the module docstring
+    get_backend().set_field(cache_key('selection', sim_name, player), tech, pickle.dumps(quantity), SELECTION_TTL)
+
+def clear_selection(sim_name, player) -> None:
+    get_backend().delete(cache_key('selection', sim_name, player))
+
+def get_submission_status(sim_name, player):
+    #(state, round) of the player's last submission for the simulation, None if nothing was submitted
+    return get_value(cache_key('submission', sim_name, player))
+
+def set_submission_status(sim_name, player, state, round = None) -> None:
+    set_value(cache_key('submission', sim_name, player), (state, round))
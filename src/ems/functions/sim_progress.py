@@ -1,27 +1,29 @@
 import asyncio
+import src.ems.functions.result_cache as result_cache
 import src.ems.functions.sql_queries as sql
-import os
+from src.ems.settings import get_settings
 import pandas as pd
+import threading
+import time
+from collections import deque
 import streamlit as st
-from sqlalchemy import create_engine, text, inspect
-from sqlalchemy.ext.asyncio import create_async_engine
-
-START_YEAR = int(os.getenv("START_YEAR"))
-YEARS_PER_SIMULATION = int(os.getenv("YEARS_PER_SIMULATION"))
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError, OperationalError
 
 def round_to_year(round):
-    current_year = START_YEAR + (round+1)*YEARS_PER_SIMULATION
+    current_year = get_settings().round_to_year(round + 1)
     return current_year
 
 def initialize_simulation_schema(db_engine, sim_name):
     
     #check if name is valid
-    if sim_name in sql.get_all_simulation(db_engine):
-        st.error("Simulation name already exist")
-        return
     if sim_name is None:
         st.error("Please enter a simulation name")
         return
+    if sql.simulation_exists(db_engine, sim_name):
+        st.error("Simulation name already exist")
+        return
     
     sql.create_storage_schemas(db_engine, sim_name)
 
@@ -49,26 +51,43 @@ def initialize_new_investment(db_engine, investment_list, current_round):
 
     return new_investment_df
 
-def update_asset_table(db_engine, sim_name):
-
+def build_investment_rows(db_engine, player, selections, current_round):
+    #One row per unit the player selected, None if nothing was selected
     new_investment_list = []
-    current_round = sql.get_current_round(db_engine, sim_name)
-    for player in sql.get_all_players(db_engine):
-        for tech in sql.get_investment_options(db_engine).keys():
-            #For each selected investment, register their details
-            invested_qty = st.session_state[f'{player}+{tech}']
-            for n in range(1, invested_qty + 1):
-                investment_row = sql.get_investment_spec(db_engine, tech)
-                investment_row = investment_row.drop(columns = ['max_build'])
-                investment_row['player'] = player
-                investment_row['asset_name'] = f'{player}_{round_to_year(current_round)}_{tech}_{chr(64+n)}'
-                new_investment_list.append(investment_row)
-
-    new_investment_df = initialize_new_investment(db_engine, new_investment_list, current_round)
-    existing_asset_table = sql.get_asset_table(db_engine, sim_name)
-
-    updated_asset_table = pd.concat([new_investment_df, existing_asset_table])
-    updated_asset_table = updated_asset_table.drop(columns = ['index'])
+    for tech, invested_qty in selections.items():
+        if invested_qty <= 0:
+            continue
+        #For each selected investment, register their details
+        investment_spec = sql.get_investment_spec(db_engine, tech).drop(columns = ['max_build'])
+        for n in range(1, invested_qty + 1):
+            investment_row = investment_spec.copy()
+            investment_row['player'] = player
+            investment_row['asset_name'] = f'{player}_{round_to_year(current_round)}_{tech}_{chr(64+n)}'
+            new_investment_list.append(investment_row)
+
+    if not new_investment_list:
+        return None
+    return initialize_new_investment(db_engine, new_investment_list, current_round)
+
+def update_asset_table(db_engine, sim_name, submissions, current_round = None):
+    """
+    Appends the submitted investments, together with the existing assets, to raw_{sim}.asset_table
+    as a single write.
+    args:
+        - db_engine: sqlalchemy engine, or an open connection to write within the caller's transaction
+        - submissions: {player: {technology: quantity}} selected by each submitting player
+        - current_round: round the investments are made in, read from the database if not given
+    """
+    if current_round is None:
+        current_round = sql.get_current_round(db_engine, sim_name)
+
+    new_investment_list = [
+        build_investment_rows(db_engine, player, selections, current_round)
+        for player, selections in submissions.items()
+    ]
+    existing_asset_table = sql.get_asset_table(db_engine, sim_name, columns = sql.get_asset_table_columns(db_engine, sim_name))
+    updated_asset_table = pd.concat([df for df in new_investment_list if df is not None] + [existing_asset_table])
+
     updated_asset_table.to_sql(
         name = 'asset_table',
         con = db_engine,
@@ -76,12 +95,13 @@ def update_asset_table(db_engine, sim_name):
         if_exists = 'append'
     )
 
-def update_progress_table(db_engine, sim_name, player):
-    current_round = sql.get_current_round(db_engine, sim_name)
+def update_progress_table(db_engine, sim_name, players, current_round = None):
+    if current_round is None:
+        current_round = sql.get_current_round(db_engine, sim_name)
     updated_progress = pd.DataFrame(
         data = {
-            'player': [player],
-            'round': [current_round]
+            'player': list(players),
+            'round': current_round
         }
     )
     updated_progress.to_sql(
@@ -92,6 +112,121 @@ def update_progress_table(db_engine, sim_name, player):
         index = False
     )
 
+MATERIALIZE_DELETE_CHUNK = 1000
+
+def _upsert_assets(con, sim_name, new_assets, applied):
+    #keyed upsert on asset_name: replace any existing row of the asset, then insert the new rows
+    #with every dim_asset_table column, numbering them after the pipeline's 'index'
+    columns = sql.get_asset_table_columns(con, sim_name, include_index = True)
+    if 'index' in columns:
+        next_index = con.execute(text(f'select coalesce(max([index]), -1) + 1 from mart_{sim_name}.dim_asset_table')).scalar()
+        new_assets = new_assets.assign(index = range(int(next_index), int(next_index) + len(new_assets)))
+    new_assets = new_assets.reindex(columns = columns)
+
+    asset_names = list(new_assets.asset_name)
+    delete_query = text(f'delete from mart_{sim_name}.dim_asset_table where asset_name in :asset_names').bindparams(
+        bindparam('asset_names', expanding = True)
+    )
+    for start in range(0, len(asset_names), MATERIALIZE_DELETE_CHUNK):
+        con.execute(delete_query, {'asset_names': asset_names[start:start + MATERIALIZE_DELETE_CHUNK]})
+    new_assets.to_sql(name = 'dim_asset_table', con = con, schema = f'mart_{sim_name}', if_exists = 'append', index = False)
+    applied.assign(materialized_at = pd.Timestamp.now()).to_sql(
+        name = sql.ASSET_WATERMARK_TABLE,
+        con = con,
+        schema = f'mart_{sim_name}',
+        if_exists = 'append',
+        index = False
+    )
+
+def materialize_asset_table(db_engine, sim_name) -> int:
+    """
+    Applies submissions not yet reflected in mart_{sim}.dim_asset_table: for each (player, round) of
+    raw_{sim}.input_progress above the materializer's watermark, the assets the player built that round
+    are read from raw_{sim}.asset_table and upserted into dim_asset_table on asset_name, and the
+    (player, round) is added to the watermark. The full pipeline refresh later rebuilds the same rows.
+    args:
+        - db_engine: sqlalchemy engine, or an open connection to apply within the caller's transaction
+    returns the number of asset rows upserted
+    """
+    progress = sql.get_input_progress(db_engine, sim_name)
+    watermark = sql.get_asset_watermark(db_engine, sim_name)
+    pending = progress.merge(watermark, on = ['player', 'round'], how = 'left', indicator = True)
+    pending = pending.loc[pending['_merge'] == 'left_only', ['player', 'round']]
+    if pending.empty:
+        return 0
+
+    asset_columns = sql.get_asset_table_columns(db_engine, sim_name)
+    new_assets = pd.concat([
+        sql.read_select(
+            db_engine,
+            f'raw_{sim_name}.asset_table',
+            asset_columns,
+            [('player', 'in', list(round_pending.player)), ('start_year', '=', round_to_year(int(round)))]
+        )
+        for round, round_pending in pending.groupby('round')
+    ])
+    #raw_ holds a snapshot per submit, keep one row per asset
+    new_assets = new_assets.drop_duplicates(subset = ['asset_name'], keep = 'last')
+
+    if isinstance(db_engine, Connection):
+        _upsert_assets(db_engine, sim_name, new_assets, pending)
+    else:
+        with db_engine.begin() as con:
+            _upsert_assets(con, sim_name, new_assets, pending)
+
+    return len(new_assets)
+
+class StaleRoundError(Exception):
+    #The submission was made for a round that has already been closed
+    pass
+
+def _is_deadlock(error):
+    #SQL Server reports a deadlock victim as error 1205 with sqlstate 40001
+    orig_args = getattr(error.orig, 'args', ())
+    return bool(orig_args) and (orig_args[0] == '40001' or '(1205)' in str(orig_args[-1]))
+
+def is_transient_error(error) -> bool:
+    #lost connections, timeouts and deadlocks can succeed on a retry, any other error fails the same way again
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and (error.connection_invalidated or _is_deadlock(error))
+    )
+
+def submit_batch(db_engine, sim_name, submissions, max_retries: int = 3, retry_delay: float = 0.5, expected_round = None):
+    """
+    Submits several players' investments for the current round in a single connection and transaction:
+    one round read, then the asset rows, the progress rows and their dim_asset_table upsert are
+    committed together or not at all.
+    Players that already have a progress row for the round are skipped, so a retried or double-clicked
+    submit never writes the assets twice. Deadlock victims are retried with backoff.
+    With expected_round, StaleRoundError is raised without writing anything if the simulation has
+    moved on to another round since the selections were made.
+
+    Returns (round, players written).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            with db_engine.begin() as con:
+                current_round = sql.get_current_round(con, sim_name)
+                if expected_round is not None and int(current_round) != int(expected_round):
+                    raise StaleRoundError(f"{sim_name} is in round {current_round}, the submission was made for round {expected_round}")
+                submitted = sql.get_submitted_players(con, sim_name, current_round)
+                pending = {player: selections for player, selections in submissions.items() if player not in submitted}
+                if pending:
+                    update_asset_table(con, sim_name, pending, current_round)
+                    update_progress_table(con, sim_name, pending.keys(), current_round)
+                    #new builds show up in the asset views without waiting for the pipeline refresh
+                    materialize_asset_table(con, sim_name)
+                    #players submitting is what moves a game along, record it with the submissions
+                    sql.update_simulation_registry(
+                        con, sim_name, round_count = int(current_round), status = 'in_progress', active_only = True
+                    )
+            return current_round, list(pending)
+        except DBAPIError as e:
+            if not _is_deadlock(e) or attempt == max_retries:
+                raise
+            print(f"Submit for {sim_name} was chosen as deadlock victim, retrying ({attempt + 1}/{max_retries})")
+            time.sleep(retry_delay * 2**attempt)
+
 async def wait_for_table(engine, schema_name: str, table_name: str, poll_interval: int = 5):
     """
     Waits for a specific table to exist in the database.
@@ -140,4 +275,105 @@ async def wait_for_player_input(engine, sim_name: str, player: str, poll_interva
             else:
                 print(f"{player}'s input for {sim_name} round {current_round} not found. Retrying in {poll_interval} seconds...")
         
-        await asyncio.sleep(poll_interval)
\ No newline at end of file
+        await asyncio.sleep(poll_interval)
+
+class ProgressWatcher:
+    """
+    Background watcher tracking every player's submission state for the current round of one simulation.
+    One watcher is shared by all viewers, so each poll interval costs a single query regardless of
+    how many facilitators are watching or how many players are in the game.
+
+    Viewers keep the last version they have seen and call changes_since() to receive only the
+    events (new round, new submission) that happened after it. The watcher stops itself once no
+    viewer has read it for idle_polls polls.
+    """
+
+    def __init__(self, engine, sim_name: str, poll_interval: int = 5, max_events: int = 500, idle_polls: int = 60):
+        self.engine = engine
+        self.sim_name = sim_name
+        self.poll_interval = poll_interval
+        self.players = sql.get_all_players(engine)
+        self.current_round = None
+        self.submitted = set()
+        self.version = 0
+        self.last_error = None
+        self.idle_polls = idle_polls
+        self._polls_since_read = 0
+
+        self._events = deque(maxlen = max_events)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target = self._run,
+            name = f'progress-watcher-{sim_name}',
+            daemon = True
+        )
+        self._thread.start()
+
+    def _record(self, event_type, value):
+        self.version += 1
+        self._events.append((self.version, event_type, value))
+
+    def poll(self):
+        current_round, submitted = sql.get_round_input_progress(self.engine, self.sim_name)
+        with self._lock:
+            new_round = current_round != self.current_round
+            if new_round:
+                self.current_round = current_round
+                self.submitted = set()
+                self._record('round', current_round)
+            for player in sorted(submitted - self.submitted):
+                self.submitted.add(player)
+                self._record('submitted', player)
+        if new_round:
+            result_cache.warm_latest_round(self.engine, self.sim_name, current_round)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                self._polls_since_read += 1
+                idle = self._polls_since_read > self.idle_polls
+            if idle:
+                print(f"Progress watcher for {self.sim_name} has no viewers, stopping")
+                self._stop_event.set()
+                break
+            try:
+                self.poll()
+                self.last_error = None
+            except Exception as e:
+                #keep watching, a transient db error should not kill the shared watcher
+                self.last_error = e
+                print(f"Progress watcher for {self.sim_name} failed to poll: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def is_running(self) -> bool:
+        return not self._stop_event.is_set()
+
+    def latest_version(self) -> int:
+        with self._lock:
+            self._polls_since_read = 0
+            return self.version
+
+    def snapshot(self):
+        with self._lock:
+            self._polls_since_read = 0
+            return {
+                'version': self.version,
+                'round': self.current_round,
+                'submitted': {player: player in self.submitted for player in self.players},
+            }
+
+    def changes_since(self, version: int):
+        """
+        Returns (latest_version, events, is_complete) where events are the (version, type, value)
+        tuples newer than the given version. is_complete is False when older events have already
+        been dropped, in which case the viewer should re-read the full snapshot.
+        """
+        with self._lock:
+            self._polls_since_read = 0
+            events = [event for event in self._events if event[0] > version]
+            is_complete = not self._events or self._events[0][0] <= version + 1
+            return self.version, events, is_complete
@@ -1,43 +1,414 @@
-import numpy as np
-import os
+from contextlib import contextmanager
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.exc import ProgrammingError
 import traceback
 
-START_YEAR = int(os.getenv("START_YEAR"))
-YEARS_PER_SIMULATION = int(os.getenv("YEARS_PER_SIMULATION"))
+@contextmanager
+def _connect(engine):
+    """
+    Read queries accept either an engine or an open connection, so they can run inside
+    a caller's transaction (e.g. the submit transaction) without opening a new connection.
+    """
+    if isinstance(engine, Connection):
+        yield engine
+    else:
+        with engine.connect() as con:
+            yield con
+
+@contextmanager
+def _begin(engine):
+    #Writes join the caller's transaction when given an open connection, otherwise commit on their own
+    if isinstance(engine, Connection):
+        yield engine
+    else:
+        with engine.begin() as con:
+            yield con
+
+FILTER_OPERATORS = ['=', '!=', '<', '<=', '>', '>=', 'in', 'not in']
+
+def build_select(table, columns = None, filters = None, order_by = None):
+    """
+    Builds a select of the needed columns and rows of a table, with the filters sent as bound
+    parameters so projection and predicates are applied by the server instead of in pandas.
+    args:
+        - table: `schema.table` or `[schema].[table]`
+        - columns: column names to return, every column if None
+        - filters: list of (column, operator, value), operator one of FILTER_OPERATORS,
+                   'in' / 'not in' take a list of values
+        - order_by: column names to sort on
+    returns the text query and its parameters, for pd.read_sql
+    """
+    projection = '*' if columns is None else ', '.join(f'[{column}]' for column in columns)
+    query = f'select {projection} from {table}'
+
+    conditions = []
+    params = {}
+    expanding = []
+    for n, (column, operator, value) in enumerate(filters or []):
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator {operator!r}, use one of {FILTER_OPERATORS}")
+        if operator in ['in', 'not in']:
+            conditions.append(f'[{column}] {operator} :p{n}')
+            expanding.append(bindparam(f'p{n}', expanding = True))
+            value = list(value)
+        else:
+            conditions.append(f'[{column}] {operator} :p{n}')
+        params[f'p{n}'] = value
+    if conditions:
+        query += ' where ' + ' and '.join(conditions)
+    if order_by:
+        query += ' order by ' + ', '.join(f'[{column}]' for column in order_by)
+
+    return text(query).bindparams(*expanding), params
+
+def read_select(engine, table, columns = None, filters = None, order_by = None):
+    #Runs build_select and returns the result as a DataFrame
+    query, params = build_select(table, columns, filters, order_by)
+    with _connect(engine) as con:
+        table = pd.read_sql(sql = query, con = con, params = params)
+
+    return table
+
+REGISTRY_TABLE = 'initial_game_setups.simulation_registry'
+SIMULATION_LAYERS = ['raw', 'stage', 'warehouse', 'mart']
+_registry_ready = set()
+
+def ensure_simulation_registry(engine) -> None:
+    """
+    Creates the simulation registry if it does not exist yet and backfills simulations created
+    before the registry existed from their mart_ schema. Only runs once per engine and process.
+    Runs DDL, so only call it with the primary engine, never the read replica.
+    """
+    if str(engine.url) in _registry_ready:
+        return
+    if engine.dialect.name != 'mssql':
+        #the DDL and backfill below are T-SQL, other databases (the SQLite stand-in) are seeded with the registry
+        _registry_ready.add(str(engine.url))
+        return
+
+    with engine.connect() as con:
+        con.execute(text(
+            f"""
+            if object_id('{REGISTRY_TABLE}', 'U') is null
+            begin
+                create table {REGISTRY_TABLE} (
+                    sim_name nvarchar(128) not null,
+                    created_at datetime2 not null default sysutcdatetime(),
+                    round_count int not null default 0,
+                    player_count int not null default 0,
+                    status nvarchar(20) not null default 'created',
+                    constraint pk_simulation_registry primary key (sim_name)
+                );
+                create index ix_simulation_registry_status 
+                on {REGISTRY_TABLE} (status, created_at);
+            end
+            """
+        ))
+        #archive_path was added after the registry was first deployed
+        con.execute(text(
+            f"""
+            if col_length('{REGISTRY_TABLE}', 'archive_path') is null
+                alter table {REGISTRY_TABLE} add archive_path nvarchar(400) null
+            """
+        ))
+        #the sim name is everything after the mart_ prefix, round_count from its finished rounds
+        con.execute(text(
+            f"""
+            insert into {REGISTRY_TABLE} (sim_name, status, round_count, player_count)
+            select 
+                substring(s.name, 6, len(s.name)),
+                'in_progress',
+                (
+                    select count(*)
+                    from sys.tables t
+                    where t.schema_id = s.schema_id and t.name like 'fct\\_asset\\_result\\_%' escape '\\'
+                ),
+                (select count(*) from initial_game_setups.player_table)
+            from sys.schemas s
+            where 
+                s.name like 'mart\\_%' escape '\\' and
+                substring(s.name, 6, len(s.name)) not in (
+                    select sim_name from {REGISTRY_TABLE}
+                )
+            """
+        ))
+        con.commit()
+
+    _registry_ready.add(str(engine.url))
 
 def create_storage_schemas(engine, sim_name) -> None:
+    ensure_simulation_registry(engine)
+    player_count = len(get_all_players(engine))
 
     with engine.connect() as con:
         #add primary key to player_table
-        con.execute(text(f'create schema raw_{sim_name}'))
-        con.execute(text(f'create schema stage_{sim_name}'))
-        con.execute(text(f'create schema warehouse_{sim_name}'))
-        con.execute(text(f'create schema mart_{sim_name}'))
         try:
+            con.execute(text(f'create schema raw_{sim_name}'))
+            con.execute(text(f'create schema stage_{sim_name}'))
+            con.execute(text(f'create schema warehouse_{sim_name}'))
+            con.execute(text(f'create schema mart_{sim_name}'))
+            con.execute(
+                text(
+                    f"""
+                    insert into {REGISTRY_TABLE} (sim_name, player_count, round_count, status)
+                    values (:sim_name, :player_count, 0, 'created')
+                    """
+                ),
+                {'sim_name': sim_name, 'player_count': player_count}
+            )
             con.commit()
         except ProgrammingError as e:
+            con.rollback()
             print(f'{sim_name} already exists!')
             traceback.print_exc()
+            return
+
+#Storage layout of the per round result tables the dashboards filter on value_type and datetime.
+#They are stored as clustered columnstore built in (value_type, datetime) order, so full round scans
+#read compressed segments and skip rowgroups outside the key range. Columnstore still scans whole
+#rowgroups for the narrow date range charts, so a nonclustered rowstore index on the same keys,
+#covering the columns those charts read, sits on top for seeks.
+ROUND_RESULT_LAYOUTS = {
+    'fct_mkt_result': {'index_columns': ['value_type', 'datetime'], 'include_columns': ['value']},
+    'rpt_grouped_dispatch_detail': {'index_columns': ['value_type', 'datetime'], 'include_columns': ['asset_type', 'value']},
+}
+#index keys can't be (n)varchar(max), which is what pandas.to_sql creates for text columns
+INDEX_KEY_TEXT_TYPE = 'nvarchar(64)'
+
+def _get_table_columns(con, schema, table):
+    return pd.read_sql(
+        sql = text(
+            """
+            select 
+                column_name, 
+                data_type, 
+                character_maximum_length,
+                is_nullable
+            from INFORMATION_SCHEMA.COLUMNS
+            where table_schema = :schema and table_name = :table
+            order by ordinal_position
+            """
+        ),
+        con = con,
+        params = {'schema': schema, 'table': table}
+    )
+
+def _index_exists(con, schema, table, index_name):
+    return con.execute(
+        text("select count(*) from sys.indexes where object_id = object_id(:table_name) and name = :index_name"),
+        {'table_name': f'{schema}.{table}', 'index_name': index_name}
+    ).scalar() > 0
+
+def _has_clustered_index(con, schema, table):
+    #type 1 clustered rowstore, type 5 clustered columnstore
+    return con.execute(
+        text("select count(*) from sys.indexes where object_id = object_id(:table_name) and type in (1, 5)"),
+        {'table_name': f'{schema}.{table}'}
+    ).scalar() > 0
+
+def _nonclustered_index_name(table, layout):
+    return f'ix_{table}_' + '_'.join(layout['index_columns'])
+
+def provision_round_result_tables(engine, sim_name, round) -> list:
+    """
+    Applies ROUND_RESULT_LAYOUTS to the round's result tables that exist. Idempotent, tables that
+    are not written yet are skipped and picked up by a later call. Returns the statements run.
+    """
+    schema = f'mart_{sim_name}'
+    executed = []
+    with engine.connect() as con:
+        for table_prefix, layout in ROUND_RESULT_LAYOUTS.items():
+            table = f'{table_prefix}_{round}'
+            columns = _get_table_columns(con, schema, table)
+            if columns.empty:
+                continue
+
+            statements = []
+            key_columns = columns[columns.column_name.isin(layout['index_columns'])]
+            for _, column in key_columns.iterrows():
+                if column.character_maximum_length == -1:
+                    nullability = 'null' if column.is_nullable == 'YES' else 'not null'
+                    statements.append(f'alter table [{schema}].[{table}] alter column [{column.column_name}] {INDEX_KEY_TEXT_TYPE} {nullability}')
+
+            keys = ', '.join(f'[{name}]' for name in layout['index_columns'])
+            if not _has_clustered_index(con, schema, table):
+                #sort the rows with a rowstore clustered index, then convert it in place; maxdop 1 keeps
+                #the rowgroups in key order instead of interleaving them across threads
+                statements.append(f'create clustered index [cci_{table}] on [{schema}].[{table}] ({keys})')
+                statements.append(
+                    f'create clustered columnstore index [cci_{table}] on [{schema}].[{table}] with (drop_existing = on, maxdop = 1)'
+                )
+            index_name = _nonclustered_index_name(table, layout)
+            if not _index_exists(con, schema, table, index_name):
+                included = ', '.join(f'[{name}]' for name in layout['include_columns'])
+                statements.append(f'create nonclustered index [{index_name}] on [{schema}].[{table}] ({keys}) include ({included})')
+
+            for statement in statements:
+                con.execute(text(statement))
+            con.commit()
+            executed += statements
+
+    return executed
+
+def verify_round_result_tables(engine, sim_name, round):
+    """
+    Returns one row per expected index of the round's result tables with whether the table and
+    the index exist, so missing provisioning shows up as present == False.
+    """
+    schema = f'mart_{sim_name}'
+    rows = []
+    with _connect(engine) as con:
+        for table_prefix, layout in ROUND_RESULT_LAYOUTS.items():
+            table = f'{table_prefix}_{round}'
+            table_exists = con.execute(text("select object_id(:table_name, 'U')"), {'table_name': f'{schema}.{table}'}).scalar() is not None
+            expected = [f'cci_{table}', _nonclustered_index_name(table, layout)]
+            for index_name in expected:
+                rows.append({
+                    'table': f'{schema}.{table}',
+                    'index': index_name,
+                    'table_exists': table_exists,
+                    'present': table_exists and _index_exists(con, schema, table, index_name),
+                })
+
+    return pd.DataFrame(rows)
+
+def provision_simulation_storage(engine, sim_name) -> list:
+    #Provisions every round already written, run it again once new rounds are written
+    executed = []
+    for round in range(0, int(get_current_round(engine, sim_name)) + 1):
+        executed += provision_round_result_tables(engine, sim_name, round)
+    return executed
+
+def get_simulation_registry(engine, status = None):
+    """
+    Returns the registry rows (sim_name, created_at, round_count, player_count, status, archive_path),
+    oldest first, optionally filtered on status. Read only, so it is safe against the read replica;
+    the registry is created on the primary by ensure_simulation_registry.
+    """
+    status_condition = '' if status is None else 'where status = :status'
+    params = {} if status is None else {'status': status}
+    query = text(
+        f"""
+        select
+            sim_name,
+            created_at,
+            round_count,
+            player_count,
+            status,
+            archive_path
+        from {REGISTRY_TABLE}
+        {status_condition}
+        order by created_at
+        """
+    )
+
+    with _connect(engine) as con:
+        table = pd.read_sql(sql = query, con = con, params = params)
+
+    return table
+
+def get_all_simulation(engine, status = None):
+    return list(get_simulation_registry(engine, status).sim_name)
+
+def simulation_exists(engine, sim_name) -> bool:
+    query = text(f"select count(*) from {REGISTRY_TABLE} where sim_name = :sim_name")
+
+    with _connect(engine) as con:
+        exists = con.execute(query, {'sim_name': sim_name}).scalar()
 
+    return bool(exists)
 
-def get_all_simulation(engine):
+def update_simulation_registry(engine, sim_name, round_count = None, status = None, archive_path = None, active_only = False) -> None:
+    """
+    Updates the given registry columns of a simulation. With active_only the row is only updated while
+    the simulation is 'created' or 'in_progress', so game activity never revives a finished or archived one.
+    engine can be an open connection to update within the caller's transaction.
+    """
+    ensure_simulation_registry(engine.engine if isinstance(engine, Connection) else engine)
+    updates = {'round_count': round_count, 'status': status, 'archive_path': archive_path}
+    updates = {column: value for column, value in updates.items() if value is not None}
+    if not updates:
+        return
 
+    set_clause = ', '.join(f'{column} = :{column}' for column in updates)
+    status_condition = " and status in ('created', 'in_progress')" if active_only else ''
+    query = text(f"update {REGISTRY_TABLE} set {set_clause} where sim_name = :sim_name{status_condition}")
+
+    with _connect(engine) as con:
+        con.execute(query, updates | {'sim_name': sim_name})
+        if not isinstance(engine, Connection):
+            con.commit()
+
+def restore_simulation_registry(engine, sim_name, round_count, player_count, status) -> None:
+    #Registers a simulation restored from an archive, whether or not its registry row survived the archive
+    ensure_simulation_registry(engine.engine if isinstance(engine, Connection) else engine)
+    params = {'sim_name': sim_name, 'round_count': round_count, 'player_count': player_count, 'status': status}
+    with _begin(engine) as con:
+        updated = con.execute(
+            text(
+                f"""
+                update {REGISTRY_TABLE}
+                set round_count = :round_count, player_count = :player_count, status = :status
+                where sim_name = :sim_name
+                """
+            ),
+            params
+        ).rowcount
+        if not updated:
+            con.execute(
+                text(
+                    f"""
+                    insert into {REGISTRY_TABLE} (sim_name, round_count, player_count, status)
+                    values (:sim_name, :round_count, :player_count, :status)
+                    """
+                ),
+                params
+            )
+
+def get_simulation_tables(engine, sim_name):
+    #(schema_name, table_name, object_type) of every table and view in the simulation's raw/stage/warehouse/mart schemas
     query = text(
         """
-        select 
-            RIGHT(name, CHARINDEX('_', REVERSE(name) + '_') - 1) as all_simulation
-        from sys.schemas 
-        where name like 'mart_%'
+        select
+            s.name as schema_name,
+            o.name as table_name,
+            o.object_type
+        from (
+            select name, schema_id, 'table' as object_type from sys.tables
+            union all
+            select name, schema_id, 'view' as object_type from sys.views
+        ) o
+        left join sys.schemas s
+        on s.schema_id = o.schema_id
+        where s.name in (:raw, :stage, :warehouse, :mart)
+        order by s.name, o.name
         """
     )
 
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
+    with _connect(engine) as con:
+        table = pd.read_sql(
+            sql = query, 
+            con = con, 
+            params = {layer: f'{layer}_{sim_name}' for layer in SIMULATION_LAYERS}
+        )
+
+    return table
 
-    return list(table.all_simulation)
+def drop_simulation_schemas(engine, sim_name) -> None:
+    #Drops every view and table of the simulation then its four schemas, in one transaction.
+    #Views go first, a schema bound view would otherwise block dropping the tables it reads
+    objects = get_simulation_tables(engine, sim_name)
+    views = objects[objects.object_type == 'view']
+    tables = objects[objects.object_type == 'table']
+    with engine.begin() as con:
+        for _, row in views.iterrows():
+            con.execute(text(f'drop view [{row.schema_name}].[{row.table_name}]'))
+        for _, row in tables.iterrows():
+            con.execute(text(f'drop table [{row.schema_name}].[{row.table_name}]'))
+        for layer in SIMULATION_LAYERS:
+            con.execute(text(f"if schema_id('{layer}_{sim_name}') is not null exec('drop schema [{layer}_{sim_name}]')"))
 
 def get_all_players(engine):
 
@@ -49,7 +420,7 @@ def get_all_players(engine):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return list(table.players)
@@ -63,7 +434,7 @@ def get_asset_life_profile(engine):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
@@ -77,24 +448,21 @@ def get_capital_cost_profile(engine):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
 
-def get_asset_table(engine, sim_name):
-    query = text(
-        f"""
-        select 
-            *
-        from mart_{sim_name}.dim_asset_table
-        """
-    )
+#Columns of an asset row, as written to raw_{sim}.asset_table by sim_progress.update_asset_table
+def get_asset_table_columns(engine, sim_name, include_index = False) -> list:
+    #dim_asset_table columns in table order, by default without the pandas 'index' column the pipeline writes
+    with _connect(engine) as con:
+        columns = _get_table_columns(con, f'mart_{sim_name}', 'dim_asset_table')
+    return [name for name in columns.column_name if include_index or name != 'index']
 
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
-
-    return table
+def get_asset_table(engine, sim_name, columns = None, filters = None):
+    #columns / filters are pushed down to the server, see build_select
+    return read_select(engine, f'mart_{sim_name}.dim_asset_table', columns, filters)
 
 
 def get_current_round(engine, sim_name):
@@ -119,11 +487,119 @@ def get_current_round(engine, sim_name):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table.number_of_rounds[0]
+
+def get_current_rounds(engine, sim_names) -> dict:
+    #{sim_name: finished round count} of several simulations in one catalog query
+    if not sim_names:
+        return {}
+    query = text(
+        """
+        select
+            s.name as schema_name,
+            count(t.name) as number_of_rounds
+        from sys.schemas s
+        left join sys.tables t
+        on t.schema_id = s.schema_id and t.name like 'fct_asset_result_%'
+        where s.name in :schema_names
+        group by s.name
+        """
+    ).bindparams(bindparam('schema_names', expanding = True))
+
+    with _connect(engine) as con:
+        table = pd.read_sql(sql = query, con = con, params = {'schema_names': [f'mart_{sim_name}' for sim_name in sim_names]})
+
+    rounds = dict(zip(table.schema_name.str[len('mart_'):], table.number_of_rounds.astype(int)))
+    return {sim_name: rounds.get(sim_name, 0) for sim_name in sim_names}
+
+def get_round_input_progress(engine, sim_name):
+    """
+    Returns the current round and the players who have submitted for it, in a single query.
+    Used by the facilitator progress watcher so every player is tracked per poll.
+    """
+    query = text(
+        f"""
+        with current_round as (
+            select 
+                count(*) as current_round
+            from sys.tables t
+            left join sys.schemas s
+            on s.schema_id = t.schema_id
+            where 
+                s.name = 'mart_{sim_name}' and
+                t.name like 'fct_asset_result_%'
+        )
+        select
+            r.current_round,
+            p.player
+        from current_round r
+        left join (
+            select distinct player, round
+            from raw_{sim_name}.input_progress
+        ) p
+        on p.round = r.current_round
+        """
+    )
+
+    try:
+        with _connect(engine) as con:
+            table = pd.read_sql(sql = query, con = con)
+    except ProgrammingError:
+        #input_progress is only created on the first submission of a simulation
+        return get_current_round(engine, sim_name), set()
+
+    return table.current_round[0], set(table.player.dropna())
     
+def get_submitted_players(engine, sim_name, round) -> set:
+    with _connect(engine) as con:
+        #input_progress is only created on the first submission of a simulation
+        table_exists = con.execute(
+            text("select object_id(:table_name, 'U')"),
+            {'table_name': f'raw_{sim_name}.input_progress'}
+        ).scalar()
+        if table_exists is None:
+            return set()
+
+        table = pd.read_sql(
+            sql = text(
+                f"""
+                select distinct player
+                from raw_{sim_name}.input_progress
+                where round = :round
+                """
+            ),
+            con = con,
+            params = {'round': int(round)}
+        )
+
+    return set(table.player)
+
+def _table_exists(con, table_name) -> bool:
+    return con.execute(text("select object_id(:table_name, 'U')"), {'table_name': table_name}).scalar() is not None
+
+def get_input_progress(engine, sim_name):
+    #Every (player, round) submission of the simulation, empty before the first submission
+    with _connect(engine) as con:
+        if not _table_exists(con, f'raw_{sim_name}.input_progress'):
+            return pd.DataFrame(columns = ['player', 'round'])
+        table = pd.read_sql(sql = text(f'select distinct player, round from raw_{sim_name}.input_progress'), con = con)
+
+    return table
+
+ASSET_WATERMARK_TABLE = 'dim_asset_table_watermark'
+
+def get_asset_watermark(engine, sim_name):
+    #(player, round) submissions already applied to mart_{sim}.dim_asset_table by the materializer
+    with _connect(engine) as con:
+        if not _table_exists(con, f'mart_{sim_name}.{ASSET_WATERMARK_TABLE}'):
+            return pd.DataFrame(columns = ['player', 'round'])
+        table = pd.read_sql(sql = text(f'select player, round from mart_{sim_name}.{ASSET_WATERMARK_TABLE}'), con = con)
+
+    return table
+
 def get_investment_options(engine):
     query = text(
         f"""
@@ -134,7 +610,7 @@ def get_investment_options(engine):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
     
     investment_dict = pd.Series(table.max_build.values, index = table.asset_type).to_dict()
@@ -151,7 +627,7 @@ def get_investment_spec(engine, technology):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
     
     return table
@@ -167,7 +643,7 @@ def get_investment_capacity(engine, technology):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
     
     return table.capacity[0]
@@ -182,50 +658,32 @@ def get_player_description(engine, player):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
     
     return table.description[0]
 
-def get_existing_asset_summary(engine, player, view_round, selected_sim):
-    view_year = START_YEAR + (view_round)*YEARS_PER_SIMULATION
-    schema = 'initial_game_setups' if selected_sim is None else f'mart_{selected_sim}'
-    table = 'asset_table' if selected_sim is None else 'dim_asset_table'
+def get_asset_capacity_table(engine, sim_name):
+    """
+    Returns every asset's generation and storage capacity with its start and end year,
+    the input of the capacity cube.
+    """
+    schema = 'initial_game_setups' if sim_name is None else f'mart_{sim_name}'
+    table = 'asset_table' if sim_name is None else 'dim_asset_table'
     query = text(
         f"""
-        with generation_capacity as(
-            select
-                asset_type as "Asset Type",
-                sum(generation_capacity) as "Capacity", 
-                'Yes' as "Established"
-            from {schema}.{table}
-            where 
-                player = '{player}' and 
-                asset_type != 'Battery' and
-                start_year <= {view_year}
-            group by asset_type
-        ), storage_capacity as (
-            select
-                asset_type as "Asset Type",
-                sum(storage_capacity) as "Capacity", 
-                'Yes' as "Established"
-            from {schema}.{table}
-            where
-                player = '{player}' and 
-                asset_type != 'Battery' and
-                start_year <= {view_year}
-            group by asset_type
-        )
-
-        select *
-        from generation_capacity
-        union
-        select *
-        from storage_capacity
+        select
+            player,
+            asset_type,
+            generation_capacity,
+            storage_capacity,
+            start_year,
+            end_year
+        from {schema}.{table}
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
     
     return table
@@ -234,23 +692,13 @@ def get_sim_input_capacity(engine, sim_name, current_year, generation = True):
     capacity_column = 'generation_capacity' if generation else 'storage_capacity'
     type_condition = "!=" if generation else "="
 
-    query = text(
-        f"""
-        select
-            asset_name,
-            {capacity_column} as capacity,
-            vom,
-            fuel_cost,
-            end_year
-        from mart_{sim_name}.dim_asset_table
-        where asset_type {type_condition} 'Battery'
-        """
+    table = get_asset_table(
+        engine,
+        sim_name,
+        columns = ['asset_name', capacity_column, 'vom', 'fuel_cost'],
+        filters = [('asset_type', type_condition, 'Battery'), ('end_year', '>=', int(current_year))]
     )
-
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
-
-    table = table[table['end_year'] >= current_year]
+    table = table.rename(columns = {capacity_column: 'capacity'})
     capacity_dict_raw = pd.Series(table.capacity.values, index = table.asset_name).to_dict()
     capacity_dict = {}
     for player in get_all_players(engine):
@@ -274,12 +722,15 @@ def get_sim_input_profiles(engine, profile_type, sim_name):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
-    profile_dict = pd.Series(table.value.values, index = np.arange(1, len(table)+1)).to_dict()
+    profile_dict = pd.Series(table.value.values, index = range(1, len(table)+1)).to_dict()
     return profile_dict
 
+def get_reporting_table(engine, sim_name, round, columns = None, filters = None):
+    return read_select(engine, f'mart_{sim_name}.reporting_sim_result_{round}', columns, filters)
+
 def get_financial_reporting_table(engine, sim_name, round):
     
     query = text(
@@ -289,145 +740,201 @@ def get_financial_reporting_table(engine, sim_name, round):
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
 
+#tCO2 per MWh dispatched, technologies not listed emit nothing
+EMISSION_INTENSITY = {'Gas': 0.6, 'Coal': 1.5}
+
+def _emission_expression(mwh_column):
+    cases = ' '.join(f"when asset_type = '{asset_type}' then {mwh_column} * {intensity}" for asset_type, intensity in EMISSION_INTENSITY.items())
+    return f'case {cases} else 0 end'
+
 def get_emission_outcome(engine, sim_name, round):
     query = text(
         f"""
         select 
             player,
-            sum(case
-                when asset_type = 'Gas' then summed_value_mwh * 0.6 --Emission intensity for Gas
-                when asset_type = 'Coal' then summed_value_mwh * 1.5 --Emission intensity for Coal
-                else 0
-            end) as total_emission_Tco2
+            sum({_emission_expression('summed_value_mwh')}) as total_emission_Tco2
         from [mart_{sim_name}].[rpt_asset_outcome_summary_{round}]
         group by player
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
 
-def get_player_mw_capacity(engine, sim_name, player, round):
-    query = text(
-        f"""
-        select 
-            sum(summed_value_mwh) as total_mwh
-        from [mart_{sim_name}].[rpt_asset_outcome_summary_{round}]
-        where
-            asset_type != 'Battery' and
-            player = '{player}'
-        """
-    )
-
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
-
-    return table.total_mwh[0]
+DELTA_METRICS = ['profit', 'capacity_mw', 'dispatch_revenue', 'emission_tco2', 'dollar_per_mwh']
 
-def get_target_table(engine):
+def _round_aggregate(sim_name, round):
+    #compact per (player, asset_type) aggregate of one round's reporting table
+    return f"""
+        select
+            player,
+            asset_type,
+            sum(annual_dispatch_revenue + annual_subsidy_revenue - annual_capital_cost - annual_vom_cost - annual_fuel_cost) as profit,
+            sum(max_capacity) as capacity_mw,
+            sum(annual_dispatch_revenue) as dispatch_revenue,
+            sum({_emission_expression('summed_value_mwh')}) as emission_tco2,
+            sum(weighted_avg_price * summed_value_mwh) / nullif(sum(summed_value_mwh), 0) as dollar_per_mwh
+        from [mart_{sim_name}].[reporting_sim_result_{round}]
+        group by player, asset_type
+    """
+
+def get_round_delta_report(engine, sim_name, round):
+    """
+    Returns round `round` vs round - 1 per (player, asset_type) in one query: each of DELTA_METRICS
+    for the round and its change from the previous round, `{metric}_delta`.
+    """
+    if int(round) < 2:
+        raise ValueError("A delta report needs a previous round, round must be 2 or later")
+
+    #totals count as 0 in a round the technology was absent, a price is left null
+    metric_columns = ',\n'.join(
+        f"c.{metric} as {metric}, c.{metric} - p.{metric} as {metric}_delta" if metric == 'dollar_per_mwh' else
+        f"coalesce(c.{metric}, 0) as {metric}, coalesce(c.{metric}, 0) - coalesce(p.{metric}, 0) as {metric}_delta"
+        for metric in DELTA_METRICS
+    )
     query = text(
         f"""
-        select *
-        from initial_game_setups.target_table
+        with current_round as ({_round_aggregate(sim_name, int(round))}),
+        previous_round as ({_round_aggregate(sim_name, int(round) - 1)})
+        select
+            coalesce(c.player, p.player) as player,
+            coalesce(c.asset_type, p.asset_type) as asset_type,
+            {metric_columns}
+        from current_round c
+        full outer join previous_round p
+        on p.player = c.player and p.asset_type = c.asset_type
+        order by 1, 2
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
 
-def get_investment_capacity_summary_table(engine, sim_name, view_year):
-    schema = 'initial_game_setups' if sim_name is None else f'mart_{sim_name}'
-    table = 'asset_table' if sim_name is None else 'dim_asset_table'
+#One select per (simulation, round), tagged with both so a batch can union many of them
+COMPARISON_QUERIES = {
+    'profit': """
+        select
+            '{sim_name}' as sim_name,
+            {round} as round,
+            player,
+            sum(annual_dispatch_revenue + annual_subsidy_revenue - annual_capital_cost - annual_vom_cost - annual_fuel_cost) as profit
+        from [mart_{sim_name}].[reporting_sim_result_{round}]
+        group by player
+    """,
+    'capacity_mix': """
+        select
+            '{sim_name}' as sim_name,
+            {round} as round,
+            asset_type,
+            sum(max_capacity) as capacity_mw
+        from [mart_{sim_name}].[reporting_sim_result_{round}]
+        group by asset_type
+    """,
+    'market_price': """
+        select
+            '{sim_name}' as sim_name,
+            {round} as round,
+            avg(value) as avg_price,
+            max(value) as max_price
+        from [mart_{sim_name}].[fct_mkt_result_{round}]
+        where value_type = 'price'
+    """,
+}
+
+def get_comparison_batch(engine, metric, sim_rounds):
+    """
+    Returns the comparison metric for every (sim_name, round) of sim_rounds in a single union all
+    query, one group of rows per pair tagged with sim_name and round.
+    """
+    if metric not in COMPARISON_QUERIES:
+        raise ValueError(f"Comparison metric must be one of {list(COMPARISON_QUERIES)}")
     query = text(
-        f"""
-        with asset_summary as (
-                select
-                    asset_type,
-                    start_year,
-                    sum(
-                        case
-                            when asset_type = 'Battery' then storage_capacity
-                            when asset_type != 'Battery' then generation_capacity
-                        end
-                    ) as summed_capacity
-                from {schema}.{table}
-                where 
-                    start_year < {view_year}
-                group by asset_type, start_year
-            )
-            select
-                asset_type,
-                start_year,
-                sum(summed_capacity) over (partition by asset_type order by start_year) as sum
-            from asset_summary
-            order by asset_type, start_year
-        """
+        '\nunion all\n'.join(
+            COMPARISON_QUERIES[metric].format(sim_name = sim_name, round = int(round))
+            for sim_name, round in sim_rounds
+        )
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
     return table
 
-def get_grouped_dispatch_result(engine, sim_name, round, date_range):
+def get_player_mw_capacity(engine, sim_name, player, round):
     query = text(
         f"""
-        select *
-        from [mart_{sim_name}].[rpt_grouped_dispatch_detail_{round}]
+        select 
+            sum(summed_value_mwh) as total_mwh
+        from [mart_{sim_name}].[rpt_asset_outcome_summary_{round}]
         where
-            value_type != 'q_st' and
-            datetime >= '{str(date_range[0])}' and
-            datetime <= '{str(date_range[1])}'
+            asset_type != 'Battery' and
+            player = '{player}'
         """
     )
 
-    with engine.connect() as con:
+    with _connect(engine) as con:
         table = pd.read_sql(sql = query, con = con)
 
-    return table
+    return table.total_mwh[0]
 
-def get_market_price(engine, sim_name, round, date_range):
-    query = text(
-        f"""
-        select *
-        from [mart_{sim_name}].[fct_mkt_result_{round}]
-        where
-            value_type = 'price' and
-            datetime >= '{str(date_range[0])}' and
-            datetime <= '{str(date_range[1])}'
-        """
+def get_target_table(engine, columns = None, filters = None):
+    return read_select(engine, 'initial_game_setups.target_table', columns, filters)
+
+def get_target_table_columns(engine):
+    """
+    Returns (key column, year columns) of the target table, one row per technology: the first column
+    after the pandas 'index' names the technology, every further column is a target year.
+    """
+    with _connect(engine) as con:
+        columns = _get_table_columns(con, 'initial_game_setups', 'target_table')
+    columns = [name for name in columns.column_name if name != 'index']
+    return columns[0], columns[1:]
+
+def _date_range_filters(date_range):
+    return [('datetime', '>=', str(date_range[0])), ('datetime', '<=', str(date_range[1]))]
+
+#what the result dashboard's dispatch chart reads: generation per technology over time
+DISPATCH_COLUMNS = ['datetime', 'asset_type', 'value']
+DISPATCH_FILTERS = [('value_type', '=', 'q')]
+
+def get_grouped_dispatch_result(engine, sim_name, round, date_range, columns = None, filters = None):
+    #q_st is excluded server side, further columns / filters can be pushed down by the caller
+    return read_select(
+        engine,
+        f'[mart_{sim_name}].[rpt_grouped_dispatch_detail_{round}]',
+        columns,
+        [('value_type', '!=', 'q_st')] + _date_range_filters(date_range) + (filters or [])
     )
 
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
+def get_market_price(engine, sim_name, round, date_range):
+    table = read_select(
+        engine,
+        f'[mart_{sim_name}].[fct_mkt_result_{round}]',
+        ['datetime', 'value'],
+        [('value_type', '=', 'price')] + _date_range_filters(date_range),
+        order_by = ['datetime']
+    )
 
     table = table.set_index(pd.to_datetime(table.datetime))
     return table['value']
 
 def get_market_demand(engine, sim_name, round, date_range):
-    query = text(
-        f"""
-        select *
-        from [mart_{sim_name}].[fct_mkt_result_{round}]
-        where
-            value_type = 'demand' and
-            datetime >= '{str(date_range[0])}' and
-            datetime <= '{str(date_range[1])}'
-        """
+    table = read_select(
+        engine,
+        f'[mart_{sim_name}].[fct_mkt_result_{round}]',
+        ['datetime', 'value'],
+        [('value_type', '=', 'demand')] + _date_range_filters(date_range),
+        order_by = ['datetime']
     )
 
-    with engine.connect() as con:
-        table = pd.read_sql(sql = query, con = con)
-
     table = table.set_index(pd.to_datetime(table.datetime))
-    table = table.sort_index()
     return table['value']
\ No newline at end of file
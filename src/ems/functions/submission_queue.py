@@ -0,0 +1,214 @@
+"""
+Durable local submission queue.
+
+The Submit button appends the player's selections, stamped with the round they were made for, to an
+append-only SQLite journal and returns immediately. A background worker drains the journal, coalesces
+everything queued for a simulation round into one submit_batch transaction (one round read, one asset
+write, one progress write) and marks the journal rows as flushed, so the database sees a few large
+writes at the round deadline instead of one small transaction per click. Queued rows survive an app
+restart and are flushed on startup; rows for a round that has since closed are rejected as stale.
+If a batch fails its entries are retried one by one, so a bad entry only fails itself: transient
+database errors stay queued for a retry, any other error marks the entry failed.
+"""
+import src.ems.functions.shared_state as shared_state
+import src.ems.functions.sim_progress as sim_progress
+import src.ems.functions.sql_queries as sql
+from src.ems.settings import get_settings
+import json
+import sqlite3
+from contextlib import contextmanager
+import threading
+import time
+import streamlit as st
+
+class SubmissionQueue:
+    """
+    Append-only journal of submissions, one row per click, ordered by seq.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as con:
+            con.execute('pragma journal_mode = wal')
+            con.execute(
+                """
+                create table if not exists submission_queue (
+                    seq integer primary key autoincrement,
+                    sim_name text not null,
+                    player text not null,
+                    selections text not null,
+                    enqueued_at real not null,
+                    flushed_at real,
+                    round integer,
+                    outcome text
+                )
+                """
+            )
+            con.execute('create index if not exists ix_submission_queue_pending on submission_queue (flushed_at, seq)')
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout = 30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def enqueue(self, sim_name, player, selections, round) -> int:
+        #round is the round the selections were made for
+        with self._connect() as con:
+            cursor = con.execute(
+                'insert into submission_queue (sim_name, player, selections, enqueued_at, round) values (?, ?, ?, ?, ?)',
+                (sim_name, player, json.dumps(selections), time.time(), int(round))
+            )
+        return cursor.lastrowid
+
+    def pending(self):
+        """
+        Returns {(sim_name, round): {player: (latest seq, selections, all seqs)}}, only the latest
+        submission of each player for a round is kept, earlier ones are superseded by it.
+        Rows queued before rounds were recorded have round None and go to the current round.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                'select seq, sim_name, round, player, selections from submission_queue where flushed_at is null order by seq'
+            ).fetchall()
+
+        batches = {}
+        for seq, sim_name, round, player, selections in rows:
+            previous_seqs = batches.get((sim_name, round), {}).get(player, (None, None, []))[2]
+            batches.setdefault((sim_name, round), {})[player] = (seq, json.loads(selections), previous_seqs + [seq])
+        return batches
+
+    def mark_flushed(self, seqs, round, outcome):
+        with self._connect() as con:
+            con.executemany(
+                'update submission_queue set flushed_at = ?, round = ?, outcome = ? where seq = ?',
+                [(time.time(), None if round is None else int(round), outcome, seq) for seq in seqs]
+            )
+
+    def mark_failed(self, seqs, error):
+        #rows that hit a transient error stay pending and are retried on the next flush
+        with self._connect() as con:
+            con.executemany(
+                'update submission_queue set outcome = ? where seq = ?',
+                [(f'error: {error}', seq) for seq in seqs]
+            )
+
+    def status(self, seq):
+        #(flushed, round, outcome) of one queued submission
+        with self._connect() as con:
+            row = con.execute('select flushed_at, round, outcome from submission_queue where seq = ?', (seq,)).fetchone()
+        if row is None:
+            return False, None, None
+        return row[0] is not None, row[1], row[2]
+
+class SubmissionQueueWorker:
+    """
+    Background thread that flushes the queue every flush_interval seconds, or as soon as
+    notify() is called after an enqueue once the interval has passed.
+    """
+
+    def __init__(self, db_engine, queue: SubmissionQueue, flush_interval: float = 2, retry_interval: float = 30):
+        self.db_engine = db_engine
+        self.queue = queue
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target = self._run, name = 'submission-queue-worker', daemon = True)
+        self._thread.start()
+
+    def notify(self):
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def flush(self):
+        for (sim_name, round), batch in self.queue.pending().items():
+            error = self._submit(sim_name, round, batch)
+            if error is None:
+                continue
+            if len(batch) > 1 and not sim_progress.is_transient_error(error):
+                #one bad entry must not hold back the others, find it by submitting each player on its own
+                print(f"Flushing {len(batch)} queued submissions for {sim_name} failed, retrying them one by one: {error}")
+                for player, entry in batch.items():
+                    player_error = self._submit(sim_name, round, {player: entry})
+                    if player_error is not None:
+                        self._fail(sim_name, round, player, entry, player_error)
+            else:
+                for player, entry in batch.items():
+                    self._fail(sim_name, round, player, entry, error)
+
+    def _submit(self, sim_name, round, batch):
+        #submits one batch and records the outcome of its entries, returns the error if it could not be written
+        submissions = {player: selections for player, (_, selections, _) in batch.items()}
+        try:
+            current_round, written = sim_progress.submit_batch(self.db_engine, sim_name, submissions, expected_round = round)
+        except sim_progress.StaleRoundError as e:
+            print(f"Rejecting {len(batch)} queued submissions for {sim_name}: {e}")
+            for player, (_, _, player_seqs) in batch.items():
+                self.queue.mark_flushed(player_seqs, round, 'stale round')
+                shared_state.set_submission_status(sim_name, player, 'stale round', round)
+            return None
+        except Exception as e:
+            return e
+
+        for player, (latest_seq, _, player_seqs) in batch.items():
+            superseded = [seq for seq in player_seqs if seq != latest_seq]
+            if superseded:
+                self.queue.mark_flushed(superseded, current_round, 'superseded')
+            outcome = 'written' if player in written else 'already submitted'
+            self.queue.mark_flushed([latest_seq], current_round, outcome)
+            shared_state.set_submission_status(sim_name, player, outcome, int(current_round))
+        return None
+
+    def _fail(self, sim_name, round, player, entry, error):
+        _, _, player_seqs = entry
+        if sim_progress.is_transient_error(error):
+            print(f"Flushing {player}'s submission for {sim_name} failed, it will be retried: {error}")
+            self.queue.mark_failed(player_seqs, error)
+        else:
+            #retrying would fail the same way, give the entry up and let the player know
+            print(f"Flushing {player}'s submission for {sim_name} failed: {error}")
+            self.queue.mark_flushed(player_seqs, round, f'error: {error}')
+            shared_state.set_submission_status(sim_name, player, 'failed', round)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Submission queue worker failed to flush: {e}")
+            #batch up clicks for at least one interval before the next flush
+            self._stop_event.wait(self.flush_interval)
+            #failed rows are retried after retry_interval even without new submissions
+            self._wake_event.wait(self.retry_interval)
+            self._wake_event.clear()
+
+@st.cache_resource(show_spinner = False)
+def get_submission_queue():
+    return SubmissionQueue(get_settings().submission_queue_path)
+
+@st.cache_resource(show_spinner = False)
+def get_submission_worker(_db_engine):
+    #One worker per process, it also flushes anything left in the journal by a previous run
+    worker = SubmissionQueueWorker(_db_engine, get_submission_queue())
+    worker.notify()
+    return worker
+
+def enqueue_submission(db_engine, sim_name, player, selections) -> int:
+    """
+    Queues the selections for the simulation's current round and returns the journal seq.
+    Raises ValueError if the simulation does not exist, nothing is queued then.
+    """
+    if not sql.simulation_exists(db_engine, sim_name):
+        raise ValueError(f"Simulation {sim_name} does not exist")
+    round = sql.get_current_round(db_engine, sim_name)
+    seq = get_submission_queue().enqueue(sim_name, player, selections, round)
+    shared_state.set_submission_status(sim_name, player, 'queued', int(round))
+    get_submission_worker(db_engine).notify()
+    return seq
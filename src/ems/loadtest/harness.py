@@ -0,0 +1,266 @@
+"""
+Concurrent-session load test for the Streamlit pages.
+
+Drives N simulated sessions of each of pages/1_Player_Input.py and pages/2_Result_Dashboard.py
+headlessly with streamlit's AppTest against the local SQLite stand-in, and reports per concurrency
+level and page:
+    - rerun latency percentiles, over reruns that completed without an exception
+    - failed sessions and the first error, kept out of the latency numbers
+    - db queries per rerun
+    - peak checked-out connections and connections opened (pool saturation)
+    - traced memory per session
+
+AppTest swaps process globals (the runtime instance and st.secrets) on every run, so each session
+runs in its own process, like one app replica serving one user. Each process keeps a single cache
+storage manager across its reruns so st.cache_data behaves as it does in a long running app, and
+--state-backend disk shares selections and query caches between the processes.
+
+usage:
+    python -m src.ems.loadtest.harness --sessions 1 5 10 30
+"""
+import argparse
+import multiprocessing
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from streamlit.runtime.caching.storage.dummies import MemoryCacheStorageManager
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.app_test as app_test_module
+
+import src.ems.functions.local_db as standin_db
+
+PLAYER_PAGE = str(ROOT / 'pages' / '1_Player_Input.py')
+RESULT_PAGE = str(ROOT / 'pages' / '2_Result_Dashboard.py')
+DEFAULT_SETTINGS = {'START_YEAR': '2025', 'YEARS_PER_SIMULATION': '5'}
+
+class DbCounters:
+    """
+    Process wide counters fed by sqlalchemy events, shared by every engine the pages create.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+        event.listen(Engine, 'before_cursor_execute', self._on_query)
+        event.listen(Pool, 'connect', self._on_connect)
+        event.listen(Pool, 'checkout', self._on_checkout)
+        event.listen(Pool, 'checkin', self._on_checkin)
+
+    def reset(self):
+        with self._lock:
+            self.queries = 0
+            self.connections_opened = 0
+            self.checked_out = 0
+            self.peak_checked_out = 0
+
+    def _on_query(self, *args):
+        with self._lock:
+            self.queries += 1
+
+    def _on_connect(self, *args):
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.checked_out -= 1
+
+class SessionError(Exception):
+    """
+    Raised when a rerun finished with an exception rendered on the page.
+    """
+
+def _keep_cache_storage():
+    """
+    AppTest hands every run a fresh MemoryCacheStorageManager, so st.cache_data would start empty
+    on each rerun. Pin one manager for the whole process instead.
+    """
+    storage_manager = MemoryCacheStorageManager()
+    app_test_module.MemoryCacheStorageManager = lambda: storage_manager
+
+def _timed_run(element_or_app, latencies, timeout):
+    start = time.perf_counter()
+    at = element_or_app.run(timeout = timeout)
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise SessionError(at.exception[0].value)
+    latencies.append(elapsed)
+    return at
+
+def _new_app(page, secrets, timeout):
+    at = AppTest.from_file(page, default_timeout = timeout)
+    for key, value in secrets.items():
+        at.secrets[key] = value
+    return at
+
+def player_session(secrets, sim_name, latencies, timeout):
+    """
+    Opens the investment page, picks the simulation and a view round, selects investments for
+    every technology and submits.
+    """
+    at = _new_app(PLAYER_PAGE, secrets, timeout)
+    at = _timed_run(at, latencies, timeout)
+    at = _timed_run(at.selectbox[0].select(sim_name), latencies, timeout)
+    at = _timed_run(at.slider[0].set_value(1), latencies, timeout)
+    for n in range(len(at.radio)):
+        at = _timed_run(at.radio[n].set_value(1), latencies, timeout)
+    at = _timed_run(at.button[0].click(), latencies, timeout)
+    return at
+
+def result_session(secrets, sim_name, latencies, timeout):
+    """
+    Opens the result dashboard, picks the simulation, scrubs through rounds and switches to the
+    overview.
+    """
+    at = _new_app(RESULT_PAGE, secrets, timeout)
+    at = _timed_run(at, latencies, timeout)
+    at = _timed_run(at.selectbox[0].select(sim_name), latencies, timeout)
+    if at.slider:
+        for round in range(int(at.slider[0].min), int(at.slider[0].max) + 1):
+            at = _timed_run(at.slider[0].set_value(round), latencies, timeout)
+    at = _timed_run(at.selectbox[1].select('Overview'), latencies, timeout)
+    return at
+
+SESSIONS = {'player': player_session, 'result': result_session}
+
+def run_session(page, secrets, sim_name, db_dirs, timeout):
+    """
+    Runs one session in a worker process and returns its measurements to the parent.
+    """
+    for db_dir in db_dirs:
+        standin_db.install(db_dir)
+    _keep_cache_storage()
+    counters = DbCounters()
+    latencies = []
+    error = ''
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    try:
+        at = SESSIONS[page](secrets, sim_name, latencies, timeout)
+    except Exception as e:
+        at = None
+        error = repr(e)
+    #the session is still referenced by at, so traced memory includes its state
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'page': page,
+        'latencies': latencies,
+        'error': error,
+        'queries': counters.queries,
+        'connections_opened': counters.connections_opened,
+        'peak_checked_out': counters.peak_checked_out,
+        'mem_mb': (current - baseline) / 1e6,
+        'peak_mem_mb': (peak - baseline) / 1e6,
+    }
+
+def _summarize(sessions, page, results, elapsed):
+    latencies = [latency for result in results for latency in result['latencies']]
+    errors = [result['error'] for result in results if result['error']]
+    reruns = max(len(latencies), 1)
+
+    return {
+        'sessions': sessions,
+        'page': page,
+        'reruns': len(latencies),
+        'p50_ms': np.percentile(latencies, 50)*1000 if latencies else np.nan,
+        'p90_ms': np.percentile(latencies, 90)*1000 if latencies else np.nan,
+        'p99_ms': np.percentile(latencies, 99)*1000 if latencies else np.nan,
+        'max_ms': max(latencies)*1000 if latencies else np.nan,
+        'queries_per_rerun': sum(result['queries'] for result in results) / reruns,
+        'connections_opened': sum(result['connections_opened'] for result in results),
+        #every process has its own pool, so the sum is the worst case held against the database
+        'peak_checked_out': sum(result['peak_checked_out'] for result in results),
+        'mem_per_session_mb': np.mean([result['mem_mb'] for result in results]),
+        'peak_mem_mb': max(result['peak_mem_mb'] for result in results),
+        'wall_s': elapsed,
+        'failed_sessions': len(errors),
+        'first_error': errors[0] if errors else '',
+    }
+
+def run_level(secrets, sim_name, db_dirs, sessions, timeout):
+    """
+    Runs `sessions` player sessions and `sessions` result sessions at once, one process each, and
+    returns a report row per page.
+    """
+    pages = [page for page in SESSIONS for _ in range(sessions)]
+    context = multiprocessing.get_context('spawn')
+
+    start = time.perf_counter()
+    with context.Pool(processes = len(pages)) as pool:
+        results = pool.starmap(run_session, [(page, secrets, sim_name, db_dirs, timeout) for page in pages])
+    elapsed = time.perf_counter() - start
+
+    return [
+        _summarize(sessions, page, [result for result in results if result['page'] == page], elapsed)
+        for page in SESSIONS
+    ]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type = int, nargs = '+', default = [1, 5, 10, 30], help = 'sessions per page at each level')
+    parser.add_argument('--rounds', type = int, default = 3)
+    parser.add_argument('--hours', type = int, default = 24*7, help = 'hourly rows per round result table')
+    parser.add_argument('--timeout', type = float, default = 120)
+    parser.add_argument('--db-dir', default = None, help = 'stand-in directory, a temporary one is used if omitted')
+    parser.add_argument('--read-db-dir', default = None, help = 'seed a second stand-in here and route reads to it as the read replica')
+    parser.add_argument('--state-backend', choices = ['memory', 'disk'], default = 'disk', help = 'disk shares selections and query caches between the session processes, like app replicas')
+    parser.add_argument('--output', default = None, help = 'optional csv path for the report')
+    args = parser.parse_args(argv)
+
+    #worker processes inherit the environment, so settings are set before any is started
+    for key, value in DEFAULT_SETTINGS.items():
+        os.environ.setdefault(key, value)
+
+    sim_name = 'loadtest'
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix = 'ems_standin_')
+    #queued submissions are flushed into the stand-in, keep their journal next to it
+    os.environ['SUBMISSION_QUEUE_PATH'] = str(pathlib.Path(db_dir) / 'submission_queue.sqlite')
+    os.environ['STATE_BACKEND'] = args.state_backend
+    os.environ['STATE_URL'] = str(pathlib.Path(db_dir) / 'shared_state.sqlite')
+    db_url = standin_db.seed(db_dir, sim_name = sim_name, rounds = args.rounds, hours = args.hours)
+    print(f'Stand-in database seeded at {db_dir}')
+    secrets = {'DB_URL': db_url}
+    db_dirs = [db_dir]
+    if args.read_db_dir:
+        secrets['DB_READ_URL'] = standin_db.seed(args.read_db_dir, sim_name = sim_name, rounds = args.rounds, hours = args.hours)
+        db_dirs.append(args.read_db_dir)
+        print(f'Read replica stand-in seeded at {args.read_db_dir}')
+
+    report = pd.DataFrame([
+        row
+        for sessions in args.sessions
+        for row in run_level(secrets, sim_name, db_dirs, sessions, args.timeout)
+    ])
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.1f}'.format):
+        print(report.drop(columns = ['first_error']).to_string(index = False))
+    for _, row in report[report.failed_sessions > 0].iterrows():
+        print(f"{row.sessions} sessions, {row.page} page: {row.failed_sessions} failed, first: {row.first_error}")
+
+    if args.output:
+        report.to_csv(args.output, index = False)
+
+
+if __name__ == '__main__':
+    main()
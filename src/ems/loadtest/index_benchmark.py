@@ -0,0 +1,76 @@
+"""
+Benchmarks the dashboard's round result queries before and after provisioning the result table
+indexes (sql_queries.ROUND_RESULT_LAYOUTS), and prints the index verification.
+
+Run it against a SQL Server copy of a simulation, the SQLite stand-in has no index DDL:
+    python -m src.ems.loadtest.index_benchmark "mssql+pyodbc://..." my_sim 3 --repeat 10
+"""
+import argparse
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import src.ems.functions.sql_queries as sql
+
+def dashboard_queries(sim_name, round, date_range):
+    #The chart queries that filter the round result tables on value_type and datetime
+    return {
+        'market_price': lambda engine: sql.get_market_price(engine, sim_name, round, date_range),
+        'market_demand': lambda engine: sql.get_market_demand(engine, sim_name, round, date_range),
+        'grouped_dispatch': lambda engine: sql.get_grouped_dispatch_result(
+            engine, sim_name, round, date_range, columns = sql.DISPATCH_COLUMNS, filters = sql.DISPATCH_FILTERS
+        ),
+    }
+
+def time_queries(engine, queries, repeat):
+    rows = []
+    for name, query in queries.items():
+        #first run warms the plan cache and buffer pool, it is not timed
+        query(engine)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query(engine)
+            timings.append(time.perf_counter() - start)
+        rows.append({'query': name, 'median_ms': statistics.median(timings)*1000, 'max_ms': max(timings)*1000})
+    return pd.DataFrame(rows).set_index('query')
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('db_url')
+    parser.add_argument('sim_name')
+    parser.add_argument('round', type = int)
+    parser.add_argument('--start', default = None, help = 'date range start, defaults to one week from the first hour')
+    parser.add_argument('--end', default = None)
+    parser.add_argument('--repeat', type = int, default = 10)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.db_url)
+    start = pd.Timestamp(args.start) if args.start else sql.get_market_price(engine, args.sim_name, args.round, ('1900-01-01', '9999-12-31')).index.min()
+    end = pd.Timestamp(args.end) if args.end else start + pd.Timedelta(days = 7)
+    #the narrow range seeks the nonclustered index, the full round scans the columnstore
+    queries = {
+        **{f'{name} (range)': query for name, query in dashboard_queries(args.sim_name, args.round, (start, end)).items()},
+        **{f'{name} (full round)': query for name, query in dashboard_queries(args.sim_name, args.round, ('1900-01-01', '9999-12-31')).items()},
+    }
+
+    before = time_queries(engine, queries, args.repeat)
+    statements = sql.provision_round_result_tables(engine, args.sim_name, args.round)
+    after = time_queries(engine, queries, args.repeat)
+
+    print('\n'.join(statements) if statements else 'Result tables were already provisioned')
+    report = before.join(after, lsuffix = '_before', rsuffix = '_after')
+    report['speedup'] = report['median_ms_before'] / report['median_ms_after']
+    print(report.round(2).to_string())
+    print(sql.verify_round_result_tables(engine, args.sim_name, args.round).to_string(index = False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Import-time breakdown of the app's page modules on a cold interpreter.
+
+Each module is imported in a fresh `python -X importtime` process and the self/cumulative times
+are grouped by top level package, so regressions in cold-start cost (a chart library or driver
+pulled in at import) show up as a new heavy row.
+
+usage:
+    python -m src.ems.loadtest.startup_profile --top 15
+"""
+import argparse
+import pathlib
+import subprocess
+import sys
+
+import pandas as pd
+
+ROOT = pathlib.Path(__file__).resolve().parents[3]
+PAGE_MODULES = [
+    'src.ems.st_pages.input_dashboard',
+    'src.ems.st_pages.result_dashboard',
+    'src.ems.st_pages.facilitator_dashboard',
+    'src.ems.st_pages.comparison_dashboard',
+]
+
+def profile_module(module):
+    """
+    Returns one row per imported module with its self and cumulative import time in ms.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd = ROOT,
+        capture_output = True,
+        text = True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{completed.stderr[-2000:]}')
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({
+            'module': name.strip(),
+            'package': name.strip().split('.')[0],
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+    return pd.DataFrame(rows)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type = int, default = 15)
+    parser.add_argument('modules', nargs = '*', default = PAGE_MODULES)
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        table = profile_module(module)
+        total_ms = table.loc[table.module == module, 'cumulative_ms'].max()
+        by_package = table.groupby('package')['self_ms'].sum().sort_values(ascending = False)
+
+        print(f'\n{module}: {total_ms:.0f} ms cumulative import time')
+        print(by_package.head(args.top).round(1).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Game configuration, loaded once from the environment (falling back to the repo .env file)
+and validated into a Settings object instead of being parsed at every module import.
+"""
+import functools
+import os
+import pathlib
+from dataclasses import dataclass
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+ENV_FILE = ROOT / '.env'
+STATE_BACKENDS = ['memory', 'disk', 'redis']
+
+class SettingsError(ValueError):
+    pass
+
+@dataclass(frozen = True)
+class Settings:
+    start_year: int
+    years_per_simulation: int
+    submission_queue_path: str
+    query_timeout: int
+    archive_dir: str
+    archive_max_age_days: int
+    archive_max_count: int
+    state_backend: str
+    state_url: str
+
+    def round_to_year(self, round):
+        return self.start_year + round*self.years_per_simulation
+
+def _read_env_file(path):
+    values = {}
+    if not path.exists():
+        return values
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        values[key.strip()] = value.strip().strip('"').strip("'")
+    return values
+
+def _parse(values, key, cast, default = None):
+    if values.get(key) in (None, ''):
+        if default is not None:
+            return default
+        raise SettingsError(f"{key} is not set, add it to the environment or {ENV_FILE.name}")
+    try:
+        return cast(values[key])
+    except ValueError:
+        raise SettingsError(f"{key} must be {cast.__name__}, got {values[key]!r}") from None
+
+@functools.lru_cache(maxsize = None)
+def get_settings() -> Settings:
+    values = _read_env_file(ENV_FILE) | dict(os.environ)
+    settings = Settings(
+        start_year = _parse(values, 'START_YEAR', int),
+        years_per_simulation = _parse(values, 'YEARS_PER_SIMULATION', int),
+        submission_queue_path = _parse(values, 'SUBMISSION_QUEUE_PATH', str, default = str(ROOT / '.submission_queue.sqlite')),
+        query_timeout = _parse(values, 'QUERY_TIMEOUT', int, default = 30),
+        archive_dir = _parse(values, 'ARCHIVE_DIR', str, default = str(ROOT / 'archives')),
+        archive_max_age_days = _parse(values, 'ARCHIVE_MAX_AGE_DAYS', int, default = 0),
+        archive_max_count = _parse(values, 'ARCHIVE_MAX_COUNT', int, default = 0),
+        state_backend = _parse(values, 'STATE_BACKEND', str, default = 'memory'),
+        state_url = _parse(values, 'STATE_URL', str, default = str(ROOT / '.shared_state.sqlite')),
+    )
+    if settings.years_per_simulation <= 0:
+        raise SettingsError("YEARS_PER_SIMULATION must be positive")
+    if settings.query_timeout < 0:
+        raise SettingsError("QUERY_TIMEOUT must be 0 (no timeout) or a number of seconds")
+    if settings.archive_max_age_days < 0 or settings.archive_max_count < 0:
+        raise SettingsError("ARCHIVE_MAX_AGE_DAYS and ARCHIVE_MAX_COUNT must be 0 (no limit) or positive")
+    if settings.state_backend not in STATE_BACKENDS:
+        raise SettingsError(f"STATE_BACKEND must be one of {STATE_BACKENDS}, got {settings.state_backend!r}")
+    if settings.state_backend == 'redis' and not settings.state_url.startswith(('redis://', 'rediss://', 'unix://')):
+        raise SettingsError("STATE_BACKEND=redis needs STATE_URL set to a redis:// url")
+
+    return settings
@@ -0,0 +1,98 @@
+import src.ems.functions.comparison as comparison
+import src.ems.functions.figure_cache as figure_cache
+import src.ems.functions.sql_queries as sql
+from src.ems.functions.db import postgres_connect
+import streamlit as st
+
+COMPARISON_VIEWS = {
+    'profit': 'Profit per Player',
+    'capacity_mix': 'Capacity Mix',
+    'market_price': 'Market Price',
+}
+
+def render_simulation_multiselect(db_engine):
+    #Archived simulations have no schemas left to query, replay them one at a time in the result dashboard
+    registry = sql.get_simulation_registry(db_engine)
+    selected_simulations = st.multiselect(
+        "Select Simulations To Compare",
+        list(registry[registry.status != 'archived'].sim_name),
+        placeholder = "Select Simulations"
+    )
+
+    return selected_simulations
+
+def render_metric_selection():
+    selected_metric = st.selectbox(
+        "Select Comparison",
+        list(COMPARISON_VIEWS.keys()),
+        format_func = lambda metric: COMPARISON_VIEWS[metric]
+    )
+    return selected_metric
+
+def build_profit_comparison(df, player):
+    import plotly.graph_objects as go
+
+    if player is not None:
+        df = df[df['player'] == player]
+    profit_df = df.groupby(['sim_name', 'round'], as_index = False)['profit'].sum()
+
+    fig = go.Figure()
+    for sim_name, sim_df in profit_df.groupby('sim_name'):
+        fig.add_trace(figure_cache.scatter_trace(x = sim_df['round'], y = sim_df['profit'], name = sim_name))
+
+    fig.update_layout(
+        xaxis_title = 'Round',
+        yaxis_title = 'Profit $'
+    )
+
+    return fig
+
+def build_capacity_mix_comparison(df):
+    import plotly.graph_objects as go
+
+    #capacity mix at each simulation's latest finished round
+    latest_df = df[df['round'] == df.groupby('sim_name')['round'].transform('max')]
+
+    fig = go.Figure()
+    for asset_type, asset_df in latest_df.groupby('asset_type'):
+        fig.add_trace(go.Bar(x = asset_df['sim_name'], y = asset_df['capacity_mw'], name = asset_type))
+
+    fig.update_layout(
+        barmode = 'stack',
+        xaxis_title = 'Simulation',
+        yaxis_title = 'Capacity MW'
+    )
+
+    return fig
+
+def build_market_price_comparison(df):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for sim_name, sim_df in df.sort_values('round').groupby('sim_name'):
+        fig.add_trace(figure_cache.scatter_trace(x = sim_df['round'], y = sim_df['avg_price'], name = sim_name))
+
+    fig.update_layout(
+        xaxis_title = 'Round',
+        yaxis_title = 'Average Market Price $/MWh'
+    )
+
+    return fig
+
+def render_comparison(db_engine, sim_names, metric):
+    df = comparison.get_comparison(db_engine, metric, sim_names)
+    if df.empty:
+        st.info("None of the selected simulations has a finished round yet")
+        return
+
+    #the figure only changes when one of the simulations finishes another round
+    rounds_key = tuple(sorted(df.groupby('sim_name')['round'].max().items()))
+    if metric == 'profit':
+        player = st.selectbox("Select Player", sorted(df['player'].unique()), index = None, placeholder = "All Players")
+        fig = figure_cache.cached_figure(('comparison', rounds_key, metric, player), lambda: build_profit_comparison(df, player))
+    elif metric == 'capacity_mix':
+        fig = figure_cache.cached_figure(('comparison', rounds_key, metric), lambda: build_capacity_mix_comparison(df))
+    else:
+        fig = figure_cache.cached_figure(('comparison', rounds_key, metric), lambda: build_market_price_comparison(df))
+
+    st.plotly_chart(fig, use_container_width = True)
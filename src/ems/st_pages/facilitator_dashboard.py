@@ -0,0 +1,112 @@
+import src.ems.functions.archive as archive
+import src.ems.functions.db as db
+import src.ems.functions.sim_progress as sim_progress
+import src.ems.functions.sql_queries as sql
+import pandas as pd
+import streamlit as st
+
+WATCHER_POLL_INTERVAL = 5
+
+@st.cache_resource(show_spinner = False, validate = lambda watcher: watcher.is_running())
+def get_progress_watcher(_db_engine, sim_name):
+    """
+    One watcher per simulation for the whole server process, shared by every facilitator session.
+    The engine is excluded from the cache key (leading underscore), the simulation name is the key.
+    A watcher that stopped after going unread is replaced on the next request.
+    """
+    return sim_progress.ProgressWatcher(_db_engine, sim_name, poll_interval = WATCHER_POLL_INTERVAL)
+
+def render_simulation_selection(db_engine):
+    selected_simulation = st.selectbox(
+        "Select Simulation To Monitor",
+        sql.get_all_simulation(db_engine, status = 'in_progress') + sql.get_all_simulation(db_engine, status = 'created'),
+        index = None,
+        placeholder = "Select Simulation"
+    )
+
+    return selected_simulation
+
+def _notify_new_events(watcher):
+    #Only the events since this session's last render are pushed as toasts
+    version_key = f'{watcher.sim_name}+watcher_version'
+    last_version = st.session_state.get(version_key)
+    if last_version is None:
+        last_version = watcher.latest_version()
+    latest_version, events, _ = watcher.changes_since(last_version)
+    for _, event_type, value in events:
+        if event_type == 'round':
+            st.toast(f"Round {value} has started")
+        elif event_type == 'submitted':
+            st.toast(f"{value} submitted")
+    st.session_state[version_key] = latest_version
+
+@st.fragment(run_every = WATCHER_POLL_INTERVAL)
+def render_progress_monitor(watcher):
+    _notify_new_events(watcher)
+    snapshot = watcher.snapshot()
+
+    if snapshot['round'] is None:
+        st.info("Waiting for the first progress update...")
+        return
+
+    submitted = snapshot['submitted']
+    no_submitted = sum(submitted.values())
+    st.metric(
+        label = f"Round {snapshot['round']} Submissions",
+        value = f"{no_submitted} / {len(submitted)}"
+    )
+    st.progress(no_submitted / len(submitted) if submitted else 0.0)
+
+    progress_df = pd.DataFrame(
+        data = {
+            'Player': list(submitted.keys()),
+            'Submitted': ['Yes' if value else 'No' for value in submitted.values()],
+        }
+    )
+    st.dataframe(progress_df, hide_index = True, use_container_width = True)
+
+    if watcher.last_error is not None:
+        st.warning(f"Last progress update failed: {watcher.last_error}")
+
+def render_finish_simulation(db_engine, sim_name):
+    #Finished simulations stop being monitored and become eligible for archiving
+    if st.button("End Simulation", type = "secondary"):
+        get_progress_watcher(db_engine, sim_name).stop()
+        sql.update_simulation_registry(db_engine, sim_name, status = 'finished')
+        st.toast(f"{sim_name} marked as finished")
+        st.rerun()
+
+def render_archive_controls(db_engine):
+    with st.expander("Archive Finished Simulations"):
+        candidates = archive.retention_candidates(db_engine)
+        if not candidates:
+            st.caption("No finished simulation is past the retention limits")
+            return
+        st.write(f"Past the retention limits: {', '.join(candidates)}")
+        if st.button("Archive Now"):
+            with st.spinner("Archiving..."):
+                outcomes = archive.apply_retention_policy(db_engine)
+            st.dataframe(
+                pd.DataFrame({'Simulation': list(outcomes.keys()), 'Bundle': list(outcomes.values())}),
+                hide_index = True,
+                use_container_width = True
+            )
+
+def render_storage_controls(sim_name):
+    #Result table indexes are built here rather than on page loads, the builds can outlast the query timeout
+    with st.expander("Result Table Storage"):
+        engine = db.maintenance_connect()
+        current_round = int(sql.get_current_round(engine, sim_name))
+        status = pd.concat(
+            [sql.verify_round_result_tables(engine, sim_name, round) for round in range(0, current_round + 1)],
+            ignore_index = True
+        )
+        missing = status[status.table_exists & ~status.present]
+        if missing.empty:
+            st.caption("Every written result table is provisioned")
+            return
+        st.write(f"{len(missing)} result tables are not provisioned yet")
+        if st.button("Provision Result Tables"):
+            with st.spinner("Building result table indexes..."):
+                statements = sql.provision_simulation_storage(engine, sim_name)
+            st.toast(f"Ran {len(statements)} provisioning statements for {sim_name}")
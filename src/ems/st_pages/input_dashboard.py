@@ -1,48 +1,29 @@
+import src.ems.functions.capacity_cube as capacity_cube
+import src.ems.functions.figure_cache as figure_cache
+import src.ems.functions.shared_state as shared_state
 import src.ems.functions.sql_queries as sql
-import os
+import src.ems.functions.submission_queue as submission_queue
+from src.ems.functions.db import postgres_connect, route_read
+from src.ems.settings import get_settings
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 import streamlit as st
-from sqlalchemy import create_engine
-import urllib
-
-START_YEAR = int(os.getenv("START_YEAR"))
-YEARS_PER_SIMULATION = int(os.getenv("YEARS_PER_SIMULATION"))
-
-def postgres_connect():
-    server = st.secrets['DB_SERVER']
-    driver = st.secrets['DB_DRIVER']
-    database = st.secrets['DB_DATABASE']
-    username = st.secrets['DB_USERNAME']
-    password = st.secrets['DB_PASSWORD']
-    db_params_tmp = 'DRIVER=' + driver + ';SERVER=' + server + ';PORT=1433;DATABASE=' + database + ';UID=' + username + ';PWD=' + password
-    db_params = urllib.parse.quote_plus(db_params_tmp)
-    engine = create_engine("mssql+pyodbc:///?odbc_connect={}".format(db_params), fast_executemany = True)
-
-    return engine
-
-def initialize_session_state(db_engine):
-    #initialize session state variable if does not exist already
-    all_players = sql.get_all_players(db_engine)
-    all_investment_tech = sql.get_investment_options(db_engine)
-
-    for player in all_players:
-        for tech in all_investment_tech.keys():
-            if f'{player}+{tech}' not in st.session_state:
-                st.session_state[f'{player}+{tech}'] = 0
-
-    #One for submit button as well
-    if 'submit_clicked' not in st.session_state:
-        st.session_state.submit_clicked = False
+
+def initialize_session_state():
+    #Investment selections live in the shared state backend, only the selection widgets' generation is per session
+    if 'selection_generation' not in st.session_state:
+        st.session_state.selection_generation = 0
 
 def render_simulation_selection(db_engine):
-    #Load player information from the initial_game_state
+    #Archived simulations have no schemas left to submit to, they are only replayed in the result dashboard
+    registry = sql.get_simulation_registry(route_read(db_engine))
+    registry = registry[registry.status != 'archived']
+    status_lookup = pd.Series(registry.status.values, index = registry.sim_name).to_dict()
     selected_simulation = st.selectbox(
         "Select Simulation File",
-        sql.get_all_simulation(db_engine),
+        list(registry.sim_name),
         index = None,
-        placeholder="Default Simulation"
+        placeholder="Default Simulation",
+        format_func = lambda sim_name: f"{sim_name} ({status_lookup[sim_name]})"
     )
 
     return selected_simulation
@@ -74,53 +55,64 @@ def render_player_selection(db_engine):
 
     return selected_player
 
-def update_investment_selection(player, tech, value):
-    st.session_state[f'{player}+{tech}'] = st.session_state[value]
+def get_investment_selection(db_engine, sim_name, player):
+    #{technology: quantity} currently selected by the player for the simulation, shared by every replica
+    selection = shared_state.get_selection(sim_name, player)
+    return {
+        tech: selection.get(tech, 0)
+        for tech in sql.get_investment_options(db_engine).keys()
+    }
+
+def update_investment_selection(sim_name, player, tech, value):
+    shared_state.set_selection(sim_name, player, tech, st.session_state[value])
 
-def render_investment_selection(db_engine, selected_player):
+def render_investment_selection(db_engine, sim_name, selected_player):
     """
     Render the radio buttons for investment selection 
     args:
         - db_engine: postgres db sqlalchemy engine where the specs of investment options are stored
-        - column: streamlit column object where the radio buttons are placed within
+        - sim_name: simulation the investments are selected for
         - selected_player: player that is currently selecting for their investment
     """
     investment_max_build = sql.get_investment_options(db_engine)
+    selection = get_investment_selection(db_engine, sim_name, selected_player)
     
     for tech, no_buttons in investment_max_build.items():
         capacity = sql.get_investment_capacity(db_engine, tech)
+        #a new generation after a submit gives fresh widgets, starting from the cleared selection
+        key = f'{sim_name}+{selected_player}+{tech}_radio_{st.session_state.selection_generation}'
         st.radio(
             f"{tech} ({capacity} MW)",
             [x for x in range(0, no_buttons+1)],
             horizontal=True,
-            index = st.session_state[f'{selected_player}+{tech}'],
-            key = f'{selected_player}+{tech}_radio', 
+            index = selection[tech],
+            key = key, 
             on_change = update_investment_selection,
-            args=[selected_player, tech,  f'{selected_player}+{tech}_radio']
+            args=[sim_name, selected_player, tech, key]
         )
 
-def summarize_pending_assets(db_engine, selected_player):
-    investment_options = sql.get_investment_options(db_engine)
+def summarize_pending_assets(db_engine, sim_name, selected_player):
     all_rows = []
-    for tech, capacity in investment_options.items():
-        key = f'{selected_player}+{tech}'
-        val = st.session_state[key]
-        if key.split("+")[0] == selected_player:
-            additional_row = pd.DataFrame(
-                data = {
-                    "Asset Type": tech,
-                    "Capacity": val*sql.get_investment_capacity(db_engine, tech),
-                    "Established": "No",
-                },
-                index = [0]
-            )
-            all_rows.append(additional_row)
+    for tech, val in get_investment_selection(db_engine, sim_name, selected_player).items():
+        additional_row = pd.DataFrame(
+            data = {
+                "Asset Type": tech,
+                "Capacity": val*sql.get_investment_capacity(db_engine, tech),
+                "Established": "No",
+            },
+            index = [0]
+        )
+        all_rows.append(additional_row)
     pending_asset_df = pd.concat(all_rows)
     return pending_asset_df
 
-def render_investment_summary_bar(db_engine, selected_player, view_round, selected_simulation):
-    existing_asset_summary_df = sql.get_existing_asset_summary(db_engine, selected_player, view_round, selected_simulation)
-    pending_asset_summary_df = summarize_pending_assets(db_engine, selected_player)
+def build_investment_summary_bar(db_engine, selected_player, view_round, selected_simulation, current_round, asset_version):
+    import plotly.express as px
+
+    cube = capacity_cube.get_capacity_cube(db_engine, selected_simulation, current_round, asset_version)
+    view_year = get_settings().round_to_year(view_round)
+    existing_asset_summary_df = capacity_cube.player_capacity_summary(cube, selected_player, view_year)
+    pending_asset_summary_df = summarize_pending_assets(route_read(db_engine), selected_simulation, selected_player)
     df_asset_summary = pd.concat([existing_asset_summary_df, pending_asset_summary_df])
     fig = px.bar(
         df_asset_summary,
@@ -129,6 +121,18 @@ def render_investment_summary_bar(db_engine, selected_player, view_round, select
         y = 'Capacity',
         color = "Established"
     )
+
+    return fig
+
+def render_investment_summary_bar(db_engine, selected_player, view_round, selected_simulation):
+    current_round = capacity_cube.simulation_round(db_engine, selected_simulation)
+    #materialized submissions and pending selections are part of the key, the figure changes whenever they do
+    asset_version = capacity_cube.asset_version(db_engine, selected_simulation)
+    selections = tuple(sorted(get_investment_selection(db_engine, selected_simulation, selected_player).items()))
+    fig = figure_cache.cached_figure(
+        (selected_simulation, current_round, asset_version, 'investment_summary', selected_player, view_round, selections),
+        lambda: build_investment_summary_bar(db_engine, selected_player, view_round, selected_simulation, current_round, asset_version)
+    )
     st.plotly_chart(fig, use_container_width = True)
     #st.table(investment_summary_df)
 
@@ -144,11 +148,37 @@ def render_simulation_name_text_input(selected_simulation):
 
     return simulation_name
 
-def submit_clicked():
-    st.session_state.submit_clicked = True
-
-def render_submit_simulation_button():
-    st.button("Submit", on_click = submit_clicked)
+def submit_investment(db_engine, read_engine, sim_name, player):
+    #on_click callback: runs before the rerun renders the selection, so a submitted selection starts the rerun cleared
+    selections = get_investment_selection(read_engine, sim_name, player)
+    try:
+        submission_queue.enqueue_submission(db_engine, sim_name, player, selections)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    shared_state.clear_selection(sim_name, player)
+    st.session_state.selection_generation += 1
+    st.toast("Investment submitted")
+
+def render_submit_simulation_button(db_engine, read_engine, sim_name, player):
+    st.button("Submit", on_click = submit_investment, args = [db_engine, read_engine, sim_name, player])
+
+def render_submission_status(sim_name, player):
+    #Status of the player's last submission, the flush happens in the background on whichever replica queued it
+    status = shared_state.get_submission_status(sim_name, player)
+    if status is None:
+        return
+    outcome, round = status
+    if outcome == 'queued':
+        st.caption("Submission queued, saving...")
+    elif outcome == 'written':
+        st.caption(f"Submission saved for round {round}")
+    elif outcome == 'already submitted':
+        st.caption(f"Round {round} submission was already saved")
+    elif outcome == 'stale round':
+        st.warning(f"Round {round} closed before the submission was saved, please submit again for the current round")
+    else:
+        st.error(f"Round {round} submission could not be saved, please submit again")
 
 #async def render_submit_simulation_button(db_engine, simulation_name):
 #    #sim_progress.update_asset_table(db_engine, selected_simulation, simulation_name)
@@ -161,46 +191,49 @@ def render_submit_simulation_button():
 #            await sim_progress.wait_for_table(db_engine, f'mart_{simulation_name}', f'reporting_sim_result_{current_round}')
 #
 
-def render_target_chart(db_engine, sim_name, selected_tech, view_round):
+def build_target_chart(db_engine, sim_name, selected_tech, view_round, current_round, asset_version):
+    import plotly.graph_objects as go
 
     #Plotting Target
-    target_df = sql.get_target_table(db_engine)
-    target_df = target_df.drop(columns = ['index'])
-    target_df = target_df.transpose()
-    target_df.columns = target_df.iloc[0]
-    target_df = target_df.iloc[1:]
+    #only the selected technology's row, one column per target year
+    read_engine = route_read(db_engine)
+    key_column, year_columns = sql.get_target_table_columns(read_engine)
+    target_df = sql.get_target_table(read_engine, columns = year_columns, filters = [(key_column, '=', selected_tech)])
+    target = target_df.iloc[0]
+    target.index = target.index.astype(int)
 
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(
-            x = target_df.index,
-            y = target_df[selected_tech],
+        figure_cache.scatter_trace(
+            x = target.index,
+            y = target,
             line = dict(dash = 'dash'),
             name = f"Targeted {selected_tech} Capacity (MW)"
         )
     )
 
-    #Plotting actual investment over target
-    sim_name = 'initial_game_setups' if sim_name is None else f'raw_{sim_name}'
-    view_year = START_YEAR + (view_round+1)*YEARS_PER_SIMULATION
-    investment_summary_df = sql.get_investment_capacity_summary_table(db_engine, sim_name, view_year)
-    pivoted_summary_df = pd.pivot_table(investment_summary_df, values = 'sum', index = 'start_year', columns=['asset_type'])
-    missing_years = set(range(2025, view_year, 5)) - set(pivoted_summary_df.index.values)
-    empty_filler_df = pd.DataFrame(
-        index = list(missing_years),
-        columns = pivoted_summary_df.columns
-    )
-    pivoted_summary_df = pd.concat([pivoted_summary_df, empty_filler_df]).sort_index().ffill()
-    pivoted_summary_df.fillna(0)
+    #Plotting actual investment over target, through the year the viewed round's builds come online
+    view_year = get_settings().round_to_year(view_round + 1)
+    cube = capacity_cube.get_capacity_cube(db_engine, sim_name, current_round, asset_version)
+    actual_capacity = capacity_cube.market_capacity_timeline(cube, selected_tech, view_year)
 
     fig.add_trace(
-        go.Scatter(
-            x = target_df.index,
-            y = pivoted_summary_df[selected_tech] - pivoted_summary_df[selected_tech].iloc[0],
+        figure_cache.scatter_trace(
+            x = actual_capacity.index,
+            y = actual_capacity - actual_capacity.iloc[0],
             line = dict(),
             name = f"Actual {selected_tech} Capacity (MW)"
         )
     )
 
+    return fig
+
+def render_target_chart(db_engine, sim_name, selected_tech, view_round):
+    current_round = capacity_cube.simulation_round(db_engine, sim_name)
+    asset_version = capacity_cube.asset_version(db_engine, sim_name)
+    fig = figure_cache.cached_figure(
+        (sim_name, current_round, asset_version, 'target_chart', selected_tech, view_round),
+        lambda: build_target_chart(db_engine, sim_name, selected_tech, view_round, current_round, asset_version)
+    )
 
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,31 +1,21 @@
+import src.ems.functions.db as db
+import src.ems.functions.figure_cache as figure_cache
+import src.ems.functions.result_cache as result_cache
 import src.ems.functions.sql_queries as sql
-import numpy as np
+from src.ems.functions.db import postgres_connect, route_read
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-from sqlalchemy import create_engine
-import urllib
-
-def postgres_connect():
-    server = st.secrets['DB_SERVER']
-    driver = st.secrets['DB_DRIVER']
-    database = st.secrets['DB_DATABASE']
-    username = st.secrets['DB_USERNAME']
-    password = st.secrets['DB_PASSWORD']
-    db_params_tmp = 'DRIVER=' + driver + ';SERVER=' + server + ';PORT=1433;DATABASE=' + database + ';UID=' + username + ';PWD=' + password
-    db_params = urllib.parse.quote_plus(db_params_tmp)
-    engine = create_engine("mssql+pyodbc:///?odbc_connect={}".format(db_params), fast_executemany = True)
-
-    return engine
 
 def render_simulation_selection(db_engine):
     #Load player information from the initial_game_state
+    registry = sql.get_simulation_registry(route_read(db_engine))
+    status_lookup = pd.Series(registry.status.values, index = registry.sim_name).to_dict()
     selected_simulation = st.selectbox(
         "Select Simulation File",
-        sql.get_all_simulation(db_engine),
+        list(registry.sim_name),
         index = None,
-        placeholder="Default Simulation"
+        placeholder="Default Simulation",
+        format_func = lambda sim_name: f"{sim_name} ({status_lookup[sim_name]})"
     )
 
     return selected_simulation
@@ -33,19 +23,30 @@ def render_simulation_selection(db_engine):
 def render_detailing_selection():
     selected_round_specificity = st.selectbox(
         "Select View",
-        ['Round Specific', 'Overview']
+        ['Round Specific', 'Overview', 'Round Delta']
     )
     return selected_round_specificity
 
 def render_select_view_round(db_engine, sim_name, round_specific):
     #Create a slider given a game state is selected
     current_round = sql.get_current_round(db_engine, sim_name)
+    #first load after a round completes starts pre-loading its results for everyone
+    result_cache.warm_latest_round(db_engine, sim_name, current_round)
     if round_specific == 'Round Specific' and sim_name is not None and current_round >= 2:
         selected_round = st.slider(
             "Select Game Round",
             min_value = 1,
-            max_value = sql.get_current_round(db_engine, sim_name)
+            max_value = current_round
+        )
+    elif round_specific == 'Round Delta' and sim_name is not None and current_round >= 3:
+        #a delta compares the round with the one before it, round 1 has none
+        selected_round = st.slider(
+            "Select Game Round",
+            min_value = 2,
+            max_value = current_round
         )
+    elif round_specific == 'Round Delta' and current_round == 2:
+        selected_round = 2
     elif current_round > 0:
         selected_round = 1
     else:
@@ -53,13 +54,13 @@ def render_select_view_round(db_engine, sim_name, round_specific):
 
     return selected_round
 
-def render_profit_line(engine, sim_name):
-    
-    all_round = sql.get_current_round(engine, sim_name)
+def build_profit_line(engine, sim_name, all_round):
+    import plotly.graph_objects as go
 
+    read_engine = db.route_read(engine, sim_name, all_round)
     all_profit_list = []
     for round in range(1, all_round + 1):
-        reporting_table = sql.get_reporting_table(engine, sim_name, round)
+        reporting_table = result_cache.get_reporting_table(read_engine, sim_name, round).copy()
         reporting_table['profit'] = reporting_table['annual_subsidy_revenue'] + reporting_table['annual_dispatch_revenue'] - reporting_table['annual_capital_cost'] - reporting_table['annual_vom_cost'] - reporting_table['annual_fuel_cost']
         grouped_profit = reporting_table.groupby(by = ['player'])['profit'].sum()
         grouped_profit.name = str(round)
@@ -68,9 +69,9 @@ def render_profit_line(engine, sim_name):
     profit_df = pd.concat(all_profit_list, axis = 1).transpose()
     
     fig = go.Figure()
-    for player in sql.get_all_players(engine):
+    for player in sql.get_all_players(read_engine):
         fig.add_trace(
-            go.Scatter(
+            figure_cache.scatter_trace(
                 x = profit_df.index,
                 y = profit_df[player],
                 name = player
@@ -82,9 +83,21 @@ def render_profit_line(engine, sim_name):
         yaxis_title = 'Profit $'
     )
 
+    return fig
+
+def render_profit_line(engine, sim_name):
+    #Only finished rounds are plotted, so the figure is fixed for a given round count
+    all_round = int(sql.get_current_round(engine, sim_name))
+    fig = figure_cache.cached_figure(
+        (sim_name, all_round, 'profit_line'),
+        lambda: build_profit_line(engine, sim_name, all_round)
+    )
+
     st.plotly_chart(fig, use_container_width=True)
 
-def render_capacity_bar (df):
+def build_capacity_bar(df):
+    import plotly.graph_objects as go
+
     items = [
         'max_capacity',
         'actual_capacity'
@@ -108,9 +121,11 @@ def render_capacity_bar (df):
         yaxis_title = 'Capacity MW'
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def build_revenue_cost_stackedbar(df):
+    import plotly.graph_objects as go
 
-def render_revenue_cost_stackedbar (df):
     items = [
         'annual_dispatch_revenue',
         'annual_subsidy_revenue',
@@ -140,9 +155,12 @@ def render_revenue_cost_stackedbar (df):
         yaxis_title = '$'
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def build_dollar_per_mwh_bar(df):
+    import numpy as np
+    import plotly.graph_objects as go
 
-def render_dollar_per_mwh_bar(df):
     wm = lambda x: np.average(x, weights=df.loc[x.index, "summed_value_mwh"])
     #Calculate market weighted average price
     market_weighted_average_price = (df['weighted_avg_price']*df['summed_value_mwh']).sum()/df['summed_value_mwh'].sum()
@@ -171,4 +189,156 @@ def render_dollar_per_mwh_bar(df):
         yaxis_title = 'Weighted Average Price $/MWh'
     )
 
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    return fig
+
+def render_capacity_bar(engine, sim_name, round):
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'capacity_bar'),
+        lambda: build_capacity_bar(result_cache.get_reporting_table(db.route_read(engine, sim_name, round), sim_name, round))
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_revenue_cost_stackedbar(engine, sim_name, round):
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'revenue_cost_stackedbar'),
+        lambda: build_revenue_cost_stackedbar(result_cache.get_reporting_table(db.route_read(engine, sim_name, round), sim_name, round))
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_dollar_per_mwh_bar(engine, sim_name, round):
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'dollar_per_mwh_bar'),
+        lambda: build_dollar_per_mwh_bar(result_cache.get_reporting_table(db.route_read(engine, sim_name, round), sim_name, round))
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+def build_market_timeseries(price, demand):
+    #hourly series over a whole round, scatter_trace switches them to WebGL
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(specs = [[{'secondary_y': True}]])
+    fig.add_trace(figure_cache.scatter_trace(x = price.index, y = price.values, name = 'Price', mode = 'lines'), secondary_y = False)
+    fig.add_trace(figure_cache.scatter_trace(x = demand.index, y = demand.values, name = 'Demand', mode = 'lines'), secondary_y = True)
+
+    fig.update_layout(xaxis_title = 'Time')
+    fig.update_yaxes(title_text = 'Price $/MWh', secondary_y = False)
+    fig.update_yaxes(title_text = 'Demand MW', secondary_y = True)
+
+    return fig
+
+def build_dispatch_timeseries(df):
+    import plotly.graph_objects as go
+
+    #generation rows only (see sql.DISPATCH_FILTERS), summed over the players of each technology
+    dispatch = df.pivot_table(index = 'datetime', columns = 'asset_type', values = 'value', aggfunc = 'sum')
+
+    fig = go.Figure()
+    for asset_type in dispatch.columns:
+        fig.add_trace(figure_cache.scatter_trace(x = dispatch.index, y = dispatch[asset_type], name = asset_type, mode = 'lines'))
+
+    fig.update_layout(
+        xaxis_title = 'Time',
+        yaxis_title = 'Dispatch MW'
+    )
+
+    return fig
+
+def render_date_range_selection(engine, sim_name, round):
+    """
+    Date range of the time series charts, the whole round by default. The whole round is cached
+    (and warmed) as result_cache.FULL_ROUND, a narrower range is queried on its own.
+    """
+    price = result_cache.get_market_price(db.route_read(engine, sim_name, round), sim_name, round)
+    if price.empty:
+        return result_cache.FULL_ROUND
+    first_day, last_day = price.index.min().date(), price.index.max().date()
+    selected = st.date_input(
+        "Select Date Range",
+        value = (first_day, last_day),
+        min_value = first_day,
+        max_value = last_day
+    )
+    #the range is incomplete while only its start has been picked
+    if len(selected) != 2 or tuple(selected) == (first_day, last_day):
+        return result_cache.FULL_ROUND
+    return (str(selected[0]), f'{selected[1]} 23:59:59')
+
+def render_market_timeseries(engine, sim_name, round, date_range = result_cache.FULL_ROUND):
+    read_engine = db.route_read(engine, sim_name, round)
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'market_timeseries', date_range),
+        lambda: build_market_timeseries(
+            result_cache.get_market_price(read_engine, sim_name, round, date_range),
+            result_cache.get_market_demand(read_engine, sim_name, round, date_range)
+        )
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_dispatch_timeseries(engine, sim_name, round, date_range = result_cache.FULL_ROUND):
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'dispatch_timeseries', date_range),
+        lambda: build_dispatch_timeseries(
+            result_cache.get_grouped_dispatch_result(db.route_read(engine, sim_name, round), sim_name, round, date_range)
+        )
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+DELTA_METRIC_LABELS = {
+    'profit': 'Profit $',
+    'capacity_mw': 'Capacity MW',
+    'dispatch_revenue': 'Dispatch Revenue $',
+    'emission_tco2': 'Emission tCO2',
+    'dollar_per_mwh': '$/MWh',
+}
+
+def build_round_delta_bar(df, metric):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for asset_type, asset_df in df.groupby('asset_type'):
+        fig.add_trace(
+            go.Bar(
+                x = asset_df['player'],
+                y = asset_df[f'{metric}_delta'],
+                name = asset_type
+            )
+        )
+
+    fig.update_layout(
+        barmode = 'relative',
+        xaxis_title = 'Player',
+        yaxis_title = f'Change in {DELTA_METRIC_LABELS[metric]}'
+    )
+
+    return fig
+
+def render_round_delta(engine, sim_name, round):
+    #Round vs previous round per player and technology, from one cached server side query
+    if round < 2:
+        st.info("Round deltas are available once two rounds have finished")
+        return
+
+    metric = st.selectbox(
+        "Select Metric",
+        list(DELTA_METRIC_LABELS.keys()),
+        format_func = lambda metric: DELTA_METRIC_LABELS[metric]
+    )
+    delta_df = result_cache.get_round_delta_report(db.route_read(engine, sim_name, round), sim_name, round)
+    fig = figure_cache.cached_figure(
+        (sim_name, round, 'round_delta_bar', metric),
+        lambda: build_round_delta_bar(delta_df, metric)
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(
+        delta_df[['player', 'asset_type', metric, f'{metric}_delta']].rename(
+            columns = {metric: f'Round {round}', f'{metric}_delta': f'Change from Round {round - 1}'}
+        ),
+        hide_index = True,
+        use_container_width = True
+    )